@@ -0,0 +1,168 @@
+# agent_profiles.py - Per-agent_id configuration registry
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+
+logger = logging.getLogger("alli-voice-agent")
+
+DEFAULT_INSTRUCTIONS = """
+You are Alli, a friendly and helpful conversational assistant.
+
+Your personality:
+- Warm, approachable, and patient
+- Clear and concise in your responses
+- Eager to help with any questions or tasks
+- Professional yet personable
+
+Guidelines:
+- Listen carefully to what the user says
+- Provide helpful, accurate responses
+- Ask clarifying questions when needed
+- Keep the conversation natural and flowing
+- Be respectful and courteous at all times
+
+Your goal is to have a pleasant conversation and assist the user with whatever they need.
+"""
+
+DEFAULT_GREETING = "Hi! I'm Alli. How can I help you today?"
+DEFAULT_TTS_VOICE = "aura-asteria-en"
+
+
+@dataclass(frozen=True)
+class AgentProfile:
+    """Everything that differs between personas served by the same worker."""
+
+    agent_id: str
+    instructions: str = DEFAULT_INSTRUCTIONS
+    tts_voice: str = DEFAULT_TTS_VOICE
+    llm_model: str = "gpt-4o-mini"
+    llm_temperature: float = 0.7
+    greeting: str = DEFAULT_GREETING
+    prewarm: bool = False
+
+    @classmethod
+    def from_dict(cls, agent_id: str, raw: dict) -> "AgentProfile":
+        known = {f.name for f in fields(cls)} - {"agent_id"}
+        unknown = set(raw) - known
+        if unknown:
+            logger.warning("Ignoring unknown profile keys for %s: %s", agent_id, sorted(unknown))
+        values = {k: v for k, v in raw.items() if k in known}
+        if "llm_temperature" in values:
+            values["llm_temperature"] = float(values["llm_temperature"])
+        # Same defaults (incl. OPENAI_MODEL / OPENAI_TEMPERATURE) as unknown ids
+        return replace(default_profile(agent_id), **values)
+
+
+def default_profile(agent_id: str = "default") -> AgentProfile:
+    """Profile used when no file is configured or the agent_id is unknown."""
+    return AgentProfile(
+        agent_id=agent_id,
+        llm_model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        llm_temperature=float(os.getenv("OPENAI_TEMPERATURE", "0.7")),
+    )
+
+
+class ProfileRegistry:
+    """
+    Maps agent_id -> AgentProfile.
+
+    Profiles come from a JSON file of the form ``{"<agent_id>": {...}}``
+    (optionally nested under a ``"profiles"`` key). The file is parsed once
+    per change; it is re-stat'ed at most every ``reload_interval`` seconds and
+    re-read when its mtime moves, so edits are picked up without a restart.
+    Built profiles are kept in a small LRU cache with a TTL.
+    """
+
+    def __init__(
+        self,
+        path: str | None,
+        *,
+        max_size: int = 128,
+        ttl: float = 300.0,
+        reload_interval: float = 5.0,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._raw: dict[str, dict] = {}
+        self._mtime: float | None = None
+        self._next_check = 0.0
+        self._cache: OrderedDict[str, tuple[AgentProfile, float]] = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "ProfileRegistry":
+        return cls(
+            os.getenv("AGENT_PROFILES_PATH"),
+            max_size=int(os.getenv("AGENT_PROFILES_CACHE_SIZE", "128")),
+            ttl=float(os.getenv("AGENT_PROFILES_TTL_SECONDS", "300")),
+            reload_interval=float(os.getenv("AGENT_PROFILES_RELOAD_SECONDS", "5")),
+        )
+
+    def _maybe_reload(self, now: float):
+        if not self.path or now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            if self._mtime is not None:
+                logger.warning("Agent profiles file %s disappeared; keeping last good copy", self.path)
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            raw = data.get("profiles", data)
+            if not isinstance(raw, dict):
+                raise ValueError("profiles must be a JSON object keyed by agent_id")
+        except Exception:
+            logger.exception("Failed to load agent profiles from %s; keeping last good copy", self.path)
+            return
+        invalid = sorted(agent_id for agent_id, entry in raw.items() if not isinstance(entry, dict))
+        if invalid:
+            logger.warning("Skipping agent profiles that are not JSON objects in %s: %s", self.path, invalid)
+            raw = {agent_id: entry for agent_id, entry in raw.items() if isinstance(entry, dict)}
+        self._raw = raw
+        self._mtime = mtime
+        self._cache.clear()
+        logger.info("📇 Loaded %d agent profile(s) from %s", len(raw), self.path)
+
+    def get(self, agent_id: str | None) -> AgentProfile:
+        agent_id = agent_id or "default"
+        now = time.monotonic()
+        with self._lock:
+            self._maybe_reload(now)
+            hit = self._cache.get(agent_id)
+            if hit is not None and hit[1] > now:
+                self._cache.move_to_end(agent_id)
+                return hit[0]
+
+            raw = self._raw.get(agent_id)
+            profile = default_profile(agent_id)
+            if raw is not None:
+                try:
+                    profile = AgentProfile.from_dict(agent_id, raw)
+                except Exception:
+                    logger.exception("Invalid profile for agent_id %s; using default", agent_id)
+
+            self._cache[agent_id] = (profile, now + self.ttl)
+            self._cache.move_to_end(agent_id)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+            return profile
+
+    def hot_profiles(self) -> list[AgentProfile]:
+        """Profiles flagged with ``"prewarm": true``."""
+        with self._lock:
+            self._maybe_reload(time.monotonic())
+            ids = [agent_id for agent_id, raw in self._raw.items() if raw.get("prewarm")]
+        return [self.get(agent_id) for agent_id in ids]
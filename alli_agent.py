@@ -2,8 +2,17 @@
 from __future__ import annotations
 
 import asyncio
+import atexit
+import hashlib
+import inspect
+import json
 import logging
 import os
+import signal
+import threading
+import time
+import wave
+import psutil
 from dotenv import load_dotenv
 
 # LiveKit SDK imports
@@ -13,10 +22,23 @@ from livekit.agents import (
     Agent,
     JobContext,
     JobProcess,
+    JobRequest,
+    JobExecutorType,
+    RoomInputOptions,
     cli,
     WorkerOptions,
 )
 from livekit.plugins import deepgram, openai, silero  # elevenlabs
+from opentelemetry import trace
+
+import call_events
+import call_tracing
+import mem_profiler
+import transcript_writer
+import turn_metrics
+import worker_status
+from agent_profiles import DEFAULT_INSTRUCTIONS, DEFAULT_TTS_VOICE, AgentProfile, ProfileRegistry
+from barge_in import BargeInMonitor
 
 load_dotenv(override=True)
 
@@ -29,31 +51,180 @@ ch = logging.StreamHandler()
 ch.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
 logger.addHandler(ch)
 
+AGENT_NAME = os.getenv("AGENT_NAME", "voice-agent")
+
+tracer = call_tracing.get_tracer("alli-agent")
+
+# How long a session waits for a dropped participant to reconnect (with a
+# refreshed token) before it is shut down
+RECONNECT_GRACE_SECONDS = float(os.getenv("ALLI_RECONNECT_GRACE_SECONDS", "30"))
+
+# Barge-in fast path: how much user speech (per VAD) interrupts the agent,
+# and whether a "false" interruption resumes the agent's speech. Resuming
+# keeps TTS/LLM work alive while paused; with it off, an interruption
+# cancels generation and clears queued audio right away.
+MIN_INTERRUPTION_SECONDS = float(os.getenv("ALLI_MIN_INTERRUPTION_SECONDS", "0.3"))
+RESUME_FALSE_INTERRUPTION = os.getenv("ALLI_RESUME_FALSE_INTERRUPTION", "0") == "1"
+
+# -------------------------
+# Multi-session mode
+# -------------------------
+# Opt-in: run jobs as threads inside one prewarmed worker process instead of
+# one process per job. Sessions keep their own STT/TTS/LLM clients; only the
+# Silero VAD model (the bulk of per-process memory) is shared.
+MULTI_SESSION = os.getenv("ALLI_MULTI_SESSION", "0") == "1"
+MAX_SESSIONS_PER_PROCESS = max(1, int(os.getenv("ALLI_MAX_SESSIONS_PER_PROCESS", "4")))
+
+_shared_lock = threading.Lock()
+_shared_vad = None
+_active_sessions = 0
+# Jobs accepted by request_fnc whose entrypoint has not started yet (job id
+# -> accepted at). They hold a slot so concurrent requests can't overshoot
+# the limit; a reservation whose job never starts expires.
+_reserved_jobs: dict[str, float] = {}
+RESERVATION_TIMEOUT_SECONDS = 30.0
+
+
+def _get_shared_vad():
+    """Load the Silero VAD once per process and hand the same instance to every session."""
+    global _shared_vad
+    with _shared_lock:
+        if _shared_vad is None:
+            _shared_vad = silero.VAD.load()
+        return _shared_vad
+
+
+def _reserve_session(job_id: str) -> bool:
+    """Hold a session slot for an accepted job; False if the process is full."""
+    with _shared_lock:
+        now = time.monotonic()
+        for stale in [j for j, at in _reserved_jobs.items() if now - at > RESERVATION_TIMEOUT_SECONDS]:
+            del _reserved_jobs[stale]
+        if _active_sessions + len(_reserved_jobs) >= MAX_SESSIONS_PER_PROCESS:
+            return False
+        _reserved_jobs[job_id] = now
+        return True
+
+
+def _release_reservation(job_id: str):
+    with _shared_lock:
+        _reserved_jobs.pop(job_id, None)
+
+
+def _session_started(job_id: str):
+    global _active_sessions
+    with _shared_lock:
+        _reserved_jobs.pop(job_id, None)
+        _active_sessions += 1
+        return _active_sessions
+
+
+def _session_ended():
+    global _active_sessions
+    with _shared_lock:
+        _active_sessions = max(0, _active_sessions - 1)
+        return _active_sessions
+
 # -------------------------
 # Agent class
 # -------------------------
 class AlliAgent(Agent):
-    def __init__(self):
-        instructions = """
-You are Alli, a friendly and helpful conversational assistant.
-
-Your personality:
-- Warm, approachable, and patient
-- Clear and concise in your responses
-- Eager to help with any questions or tasks
-- Professional yet personable
-
-Guidelines:
-- Listen carefully to what the user says
-- Provide helpful, accurate responses
-- Ask clarifying questions when needed
-- Keep the conversation natural and flowing
-- Be respectful and courteous at all times
-
-Your goal is to have a pleasant conversation and assist the user with whatever they need.
-"""
+    def __init__(self, instructions: str = DEFAULT_INSTRUCTIONS):
         super().__init__(instructions=instructions)
 
+# -------------------------
+# Agent profiles
+# -------------------------
+profiles = ProfileRegistry.from_env()
+
+GREETING_CACHE_DIR = os.getenv("GREETING_CACHE_DIR", "greeting_cache")
+_greeting_audio: dict[str, list[rtc.AudioFrame]] = {}
+
+
+def _parse_metadata(raw_meta) -> dict:
+    try:
+        meta = json.loads(raw_meta) if isinstance(raw_meta, str) and raw_meta else (raw_meta or {})
+        return meta if isinstance(meta, dict) else {}
+    except Exception:
+        logger.exception("Failed to parse job metadata; continuing without it")
+        return {}
+
+
+def _greeting_key(profile: AgentProfile) -> str:
+    return hashlib.sha1(f"{profile.tts_voice}\n{profile.greeting}".encode("utf-8")).hexdigest()[:16]
+
+
+def _load_greeting_audio(profile: AgentProfile) -> list[rtc.AudioFrame] | None:
+    """Return cached greeting frames for a profile, reading the on-disk cache if needed."""
+    key = _greeting_key(profile)
+    frames = _greeting_audio.get(key)
+    if frames is not None:
+        return frames
+
+    path = os.path.join(GREETING_CACHE_DIR, f"{key}.wav")
+    if not os.path.exists(path):
+        return None
+    frames = []
+    with wave.open(path, "rb") as w:
+        sample_rate, num_channels = w.getframerate(), w.getnchannels()
+        chunk = sample_rate // 10  # 100ms frames
+        while True:
+            data = w.readframes(chunk)
+            if not data:
+                break
+            frames.append(rtc.AudioFrame(
+                data=data,
+                sample_rate=sample_rate,
+                num_channels=num_channels,
+                samples_per_channel=len(data) // (2 * num_channels),
+            ))
+    _greeting_audio[key] = frames
+    return frames
+
+
+# Greeting cache writes still running; referenced so they aren't garbage-collected
+_cache_tasks: set[asyncio.Task] = set()
+
+
+def _write_greeting_audio(profile: AgentProfile, frames: list[rtc.AudioFrame]):
+    path = os.path.join(GREETING_CACHE_DIR, f"{_greeting_key(profile)}.wav")
+    try:
+        os.makedirs(GREETING_CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with wave.open(tmp, "wb") as w:
+            w.setnchannels(frames[0].num_channels)
+            w.setsampwidth(2)
+            w.setframerate(frames[0].sample_rate)
+            w.writeframes(b"".join(bytes(f.data) for f in frames))
+        os.replace(tmp, path)
+        logger.info("💾 Cached greeting audio for agent_id %s", profile.agent_id)
+    except Exception:
+        logger.exception("Failed to cache greeting audio for agent_id %s", profile.agent_id)
+
+
+async def _synthesize_and_cache(tts, profile: AgentProfile):
+    """
+    Yield the greeting's TTS audio for ``session.say`` and cache the same
+    frames, so the played greeting is synthesized only once. A greeting cut
+    short by an interruption is not cached.
+    """
+    frames = []
+    async with tts.synthesize(profile.greeting) as stream:
+        async for ev in stream:
+            frames.append(ev.frame)
+            yield ev.frame
+    if not frames:
+        return
+    _greeting_audio[_greeting_key(profile)] = frames
+    task = asyncio.create_task(asyncio.to_thread(_write_greeting_audio, profile, frames))
+    _cache_tasks.add(task)
+    task.add_done_callback(_cache_tasks.discard)
+
+
+async def _replay(frames: list[rtc.AudioFrame]):
+    for frame in frames:
+        yield frame
+
 # -------------------------
 # Prewarm function
 # -------------------------
@@ -63,14 +234,35 @@ def prewarm(proc: JobProcess):
     This runs once per process to warm up models, improving performance.
     """
     logger.info("🔥 Prewarming process with models...")
+    mem_profiler.start()
+    mem_profiler.install_signal_handler()
     
     # Load and cache models in process userdata
     try:
-        proc.userdata["vad"] = silero.VAD.load()
+        proc.userdata["vad"] = _get_shared_vad() if MULTI_SESSION else silero.VAD.load()
         logger.info("✅ Silero VAD prewarmed")
     except Exception as e:
         logger.exception("❌ Failed to prewarm Silero VAD: %s", e)
-    
+
+    try:
+        hot_profiles = profiles.hot_profiles()
+    except Exception as e:
+        logger.exception("❌ Failed to read hot agent profiles: %s", e)
+        hot_profiles = []
+    for profile in hot_profiles:
+        try:
+            if _load_greeting_audio(profile) is not None:
+                logger.info("✅ Greeting audio prewarmed for agent_id %s", profile.agent_id)
+        except Exception as e:
+            logger.exception("❌ Failed to load greeting audio for %s: %s", profile.agent_id, e)
+
+    if MULTI_SESSION:
+        # Provider clients are bound to the job's event loop, so in multi-session
+        # mode they are created per session in the entrypoint instead.
+        _write_proc_marker(busy=False)
+        logger.info("🎉 Prewarm complete (multi-session, max %d per process)", MAX_SESSIONS_PER_PROCESS)
+        return
+
     try:
         proc.userdata["stt"] = deepgram.STT(model="nova-3")
         logger.info("✅ Deepgram STT prewarmed")
@@ -89,13 +281,179 @@ def prewarm(proc: JobProcess):
     #     logger.exception("❌ Failed to prewarm ElevenLabs TTS: %s", e)
     
     try:
-        proc.userdata["tts"] = deepgram.TTS(model="aura-asteria-en")
+        proc.userdata["tts"] = deepgram.TTS(model=DEFAULT_TTS_VOICE)
         logger.info("✅ Deepgram TTS prewarmed")
     except Exception as e:
         logger.exception("❌ Failed to prewarm Deepgram TTS: %s", e)
+
+    # One TTS client per voice used by a hot profile
+    tts_by_voice = proc.userdata.setdefault("tts_by_voice", {})
+    if "tts" in proc.userdata:
+        tts_by_voice[DEFAULT_TTS_VOICE] = proc.userdata["tts"]
+    for profile in hot_profiles:
+        if profile.tts_voice in tts_by_voice:
+            continue
+        try:
+            tts_by_voice[profile.tts_voice] = deepgram.TTS(model=profile.tts_voice)
+            logger.info("✅ Deepgram TTS prewarmed (voice: %s)", profile.tts_voice)
+        except Exception as e:
+            logger.exception("❌ Failed to prewarm TTS voice %s: %s", profile.tts_voice, e)
     
+    _write_proc_marker(busy=False)
     logger.info("🎉 Prewarm complete")
 
+# -------------------------
+# Drain mode
+# -------------------------
+# SIGUSR1 puts the worker into drain: it reports itself full so no new jobs
+# are assigned, rejects any that still arrive, and exits once in-flight
+# sessions have finished or the deadline has passed.
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("ALLI_DRAIN_TIMEOUT_SECONDS", "600"))
+
+_draining = threading.Event()
+_drain_deadline: float | None = None
+_drain_exit_sent = False
+_drain_logged: int | None = None
+_status_name = f"{AGENT_NAME}-{worker_status.worker_id()}"
+
+
+def _on_drain_signal(signum, frame):
+    global _drain_deadline
+    if not _draining.is_set():
+        _drain_deadline = time.monotonic() + DRAIN_TIMEOUT_SECONDS
+        _draining.set()
+        logger.info("🚰 Drain requested; finishing in-flight sessions (deadline %.0fs)", DRAIN_TIMEOUT_SECONDS)
+
+
+def _check_drain(active: int):
+    """Log drain progress and stop the worker once it is empty or out of time."""
+    global _drain_exit_sent, _drain_logged
+    if _drain_exit_sent:
+        return
+    remaining_time = max(0.0, _drain_deadline - time.monotonic())
+    # load_fnc calls this every tick; log progress only when it changes
+    if active != _drain_logged:
+        _drain_logged = active
+        logger.info("🚰 Draining: %d session(s) remaining, %.0fs to deadline", active, remaining_time)
+    if active == 0 or remaining_time == 0:
+        if active:
+            logger.warning("⏰ Drain deadline reached with %d session(s) still active", active)
+        _drain_exit_sent = True
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
+# -------------------------
+# Load reporting
+# -------------------------
+# The worker's status report tells the token service how much warm capacity
+# it has: idle prewarmed processes and recent turn latencies come from the
+# markers that job processes write (see worker_status).
+_MARKER_INTERVAL_SECONDS = 2.0
+_marker_written_at = 0.0
+
+
+def _proc_key() -> str:
+    return f"{os.getpid()}-{threading.get_ident()}"
+
+
+def _write_proc_marker(busy: bool, force: bool = True):
+    global _marker_written_at
+    worker_pid = os.getenv("ALLI_WORKER_PID")
+    if not worker_pid:
+        return
+    now = time.monotonic()
+    if not force and now - _marker_written_at < _MARKER_INTERVAL_SECONDS:
+        return
+    _marker_written_at = now
+    try:
+        worker_status.write_proc_marker(_proc_key(), {
+            "worker_pid": int(worker_pid),
+            "prewarmed": True,
+            "busy": busy,
+            "turn_latencies_ms": [round(t * 1000) for t in list(turn_metrics.recent_turn_latencies)[-20:]],
+        })
+    except Exception:
+        logger.exception("Failed to write process marker")
+
+
+def _publish_status(active: int, load: float):
+    try:
+        markers = worker_status.read_proc_markers(os.getpid())
+        latencies = [t for m in markers for t in m.get("turn_latencies_ms", [])]
+        worker_status.write_report(_status_name, {
+            "agent_name": AGENT_NAME,
+            "worker_id": worker_status.worker_id(),
+            "draining": _draining.is_set(),
+            "active_sessions": active,
+            "idle_warm": sum(1 for m in markers if not m.get("busy")),
+            "prewarmed": bool(markers),
+            "load": round(load, 3),
+            "max_sessions": MAX_SESSIONS_PER_PROCESS if MULTI_SESSION else None,
+            "turn_p50_ms": worker_status.percentile(latencies, 50),
+            "turn_p95_ms": worker_status.percentile(latencies, 95),
+        })
+    except Exception:
+        logger.exception("Failed to publish worker status")
+
+# -------------------------
+# Job admission / load
+# -------------------------
+async def request_fnc(req: JobRequest):
+    """Reject new jobs while draining or once this process hosts the maximum number of sessions."""
+    # Runs on the worker's loop, which hosts thread-executor sessions
+    mem_profiler.install_signal_handler()
+    if _draining.is_set():
+        logger.info("⛔ Rejecting job for room %s: worker is draining", req.room.name)
+        await req.reject()
+        return
+    if not MULTI_SESSION:
+        await req.accept()
+        return
+    if not _reserve_session(req.id):
+        logger.info("⛔ Rejecting job for room %s: %d/%d sessions active or starting",
+                    req.room.name, _active_sessions + len(_reserved_jobs), MAX_SESSIONS_PER_PROCESS)
+        await req.reject()
+        return
+    try:
+        await req.accept()
+    except BaseException:
+        _release_reservation(req.id)
+        raise
+
+
+# The SDK's own load calculation, captured from WorkerOptions in __main__
+_default_load_fnc = None
+
+
+def load_fnc(worker) -> float:
+    """
+    Report worker load and publish the worker's status report.
+
+    Draining workers report full load. In multi-session mode load is the
+    fraction of session slots in use; otherwise it is the SDK's default.
+    """
+    active = len(worker.active_jobs)
+    mem_profiler.update_process_metrics()
+    if _draining.is_set():
+        load = 1.0
+    elif MULTI_SESSION:
+        load = min(1.0, active / MAX_SESSIONS_PER_PROCESS)
+    elif _default_load_fnc is not None:
+        takes_worker = len(inspect.signature(_default_load_fnc).parameters) > 0
+        load = _default_load_fnc(worker) if takes_worker else _default_load_fnc()
+    else:
+        load = psutil.cpu_percent(interval=None) / 100.0
+    _publish_status(active, load)
+    if _draining.is_set():
+        _check_drain(active)
+    return load
+
+async def _on_session_shutdown():
+    remaining = _session_ended()
+    worker_status.remove_proc_marker(_proc_key())
+    logger.info("📉 Session closed; %d session(s) still active in this process", remaining)
+    await asyncio.to_thread(call_tracing.flush)
+
 # -------------------------
 # Entrypoint
 # -------------------------
@@ -108,60 +466,180 @@ async def entrypoint(ctx: JobContext):
       - Starts the conversation
     """
     logger.info("🚀 Entrypoint starting for room: %s", ctx.room.name)
-    await ctx.connect()
-    
+    mem_profiler.install_signal_handler()
+    active = _session_started(ctx.job.id)
+    _write_proc_marker(busy=True)
+    ctx.add_shutdown_callback(_on_session_shutdown)
+    metadata = _parse_metadata(getattr(ctx.job, "metadata", None))
+
+    # Continue the call's trace started by the token service
+    trace_parent = call_tracing.extract(metadata)
+    if metadata.get("dispatched_at"):
+        tracer.start_span(
+            "job.assignment", context=trace_parent, start_time=int(metadata["dispatched_at"])
+        ).end()
+    call_span = tracer.start_span("agent.entrypoint", context=trace_parent, attributes={"room": ctx.room.name})
+    call_context = trace.set_span_in_context(call_span)
+
     room_name = ctx.room.name
-    logger.info("✅ Connected to room: %s", room_name)
+    session_started = False
+    # Everything after the span starts is inside the try so failing connects
+    # and session starts still end (and export) it
+    try:
+        with tracer.start_as_current_span("ctx.connect", context=call_context):
+            await ctx.connect()
+
+        logger.info("✅ Connected to room: %s (%d session(s) in this process)", room_name, active)
+        call_events.publish(room_name, "agent_joined")
+
+        profiler = mem_profiler.SessionProfiler(room_name)
+        await asyncio.to_thread(profiler.start)
+
+        async def _end_profiler():
+            await asyncio.to_thread(profiler.end)
+
+        ctx.add_shutdown_callback(_end_profiler)
+
+        async def _publish_session_ended():
+            call_events.publish(room_name, call_events.FINAL_EVENT)
+
+        ctx.add_shutdown_callback(_publish_session_ended)
 
-    # -------------------------
-    # AgentSession: Deepgram STT + OpenAI LLM + ElevenLabs TTS
-    # -------------------------
+        profile = profiles.get(metadata.get("agent_id"))
+        logger.info("📇 Using profile for agent_id: %s", profile.agent_id)
+        call_span.set_attribute("agent_id", profile.agent_id)
+
+        # -------------------------
+        # AgentSession: Deepgram STT + OpenAI LLM + ElevenLabs TTS
+        # -------------------------
     
-    # Use prewarmed models from process userdata (loaded by prewarm function)
-    logger.info("🔥 Loading models from prewarmed cache...")
-    vad = ctx.proc.userdata.get("vad") or silero.VAD.load()
-    stt = ctx.proc.userdata.get("stt") or deepgram.STT(model="nova-3")
-    # tts = ctx.proc.userdata.get("tts") or elevenlabs.TTS(
-    #     model="eleven_flash_v2_5",
-    #     voice_id=os.getenv("ELEVENLABS_VOICE_ID", "56AoDkrOh6qfVPDXZ7Pt")
-    # )
-    tts = ctx.proc.userdata.get("tts") or deepgram.TTS(model="aura-asteria-en")
-    logger.info("✅ Models loaded successfully")
+        # Use prewarmed models from process userdata (loaded by prewarm function)
+        logger.info("🔥 Loading models from prewarmed cache...")
+        vad = ctx.proc.userdata.get("vad") or (_get_shared_vad() if MULTI_SESSION else silero.VAD.load())
+        stt = ctx.proc.userdata.get("stt") or deepgram.STT(model="nova-3")
+        # tts = ctx.proc.userdata.get("tts") or elevenlabs.TTS(
+        #     model="eleven_flash_v2_5",
+        #     voice_id=os.getenv("ELEVENLABS_VOICE_ID", "56AoDkrOh6qfVPDXZ7Pt")
+        # )
+        tts = ctx.proc.userdata.get("tts_by_voice", {}).get(profile.tts_voice) or deepgram.TTS(model=profile.tts_voice)
+        logger.info("✅ Models loaded successfully")
     
-    session = AgentSession(
-        stt=stt,
-        llm=openai.LLM(
-            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-            temperature=float(os.getenv("OPENAI_TEMPERATURE", "0.7")),
-        ),
-        tts=tts,
-        vad=vad,
-    )
+        session = AgentSession(
+            stt=stt,
+            llm=openai.LLM(
+                model=profile.llm_model,
+                temperature=profile.llm_temperature,
+            ),
+            tts=tts,
+            vad=vad,
+            allow_interruptions=True,
+            min_interruption_duration=MIN_INTERRUPTION_SECONDS,
+            resume_false_interruption=RESUME_FALSE_INTERRUPTION,
+        )
+
+        ctx.session = session
+
+        barge_in = BargeInMonitor(room_name)
+        barge_in.attach(session)
+
+        transcripts = transcript_writer.get_writer()
+
+        def _on_turn(speech_id, parts, total):
+            _write_proc_marker(busy=True, force=False)
+            if transcripts is not None:
+                transcripts.write(room_name, "turn_metrics", speech_id=speech_id, **parts, total=total)
 
-    ctx.session = session
+        turns = turn_metrics.TurnLatencyTracker(on_turn=_on_turn)
+        turns.attach(session)
 
-    # Create agent instance
-    agent = AlliAgent()
+        async def _log_barge_in_summary():
+            logger.info("✋ Barge-in summary for room %s: %s", room_name, barge_in.summary())
+
+        ctx.add_shutdown_callback(_log_barge_in_summary)
+
+        if transcripts is not None:
+            # Stream the conversation as it happens; shutdown only waits for a flush
+            call_started = time.monotonic()
+            transcripts.write(room_name, "call_start", agent_id=profile.agent_id)
+
+            @session.on("conversation_item_added")
+            def _on_item_added(ev):
+                item = ev.item
+                if getattr(item, "type", None) == "message":
+                    transcripts.write(room_name, "message", role=item.role, text=item.text_content,
+                                      interrupted=item.interrupted)
+
+            async def _end_transcript():
+                transcripts.write(room_name, "call_end", duration=round(time.monotonic() - call_started, 3),
+                                  turns=turns.turns, barge_in=barge_in.summary())
+                # Finishes the gzip file if this was the process's last open call
+                if not await asyncio.to_thread(transcripts.flush, 5.0, finish_if_idle=True):
+                    logger.warning("Transcript flush for room %s timed out", room_name)
+
+            ctx.add_shutdown_callback(_end_transcript)
+
+        # Create agent instance
+        agent = AlliAgent(instructions=profile.instructions)
     
-    # Start session
-    logger.info("🎬 Starting agent session...")
-    session_task = asyncio.create_task(
-        session.start(
-            agent=agent,
-            room=ctx.room,
+        # Start session
+        logger.info("🎬 Starting agent session...")
+        session_task = asyncio.create_task(
+            session.start(
+                agent=agent,
+                room=ctx.room,
+                # Keep the session (and its chat history) when the participant
+                # drops, so a reconnect resumes the same conversation
+                room_input_options=RoomInputOptions(close_on_disconnect=False),
+            )
         )
-    )
 
-    await session_task
-    logger.info("✅ AgentSession started; waiting for participant in room: %s", room_name)
+        with tracer.start_as_current_span("session.start", context=call_context):
+            await session_task
+        session_started = True
+        call_events.publish(room_name, "session_started", agent_id=profile.agent_id)
+        logger.info("✅ AgentSession started; waiting for participant in room: %s", room_name)
 
-    try:
         # Wait for participant to join the room
-        participant = await ctx.wait_for_participant()
+        with tracer.start_as_current_span("wait_for_participant", context=call_context):
+            participant = await ctx.wait_for_participant()
         logger.info("👤 Participant joined: %s", getattr(participant, "identity", "<no-identity>"))
+        call_events.publish(room_name, "participant_joined", participant=getattr(participant, "identity", None))
+
+        reconnect_timer: asyncio.TimerHandle | None = None
+
+        def _end_after_grace():
+            logger.info("⌛ Participant did not reconnect within %.0fs; ending session", RECONNECT_GRACE_SECONDS)
+            ctx.shutdown(reason="participant did not reconnect")
+
+        @ctx.room.on("participant_disconnected")
+        def _on_participant_disconnected(p: rtc.RemoteParticipant):
+            nonlocal reconnect_timer
+            if p.identity == participant.identity and reconnect_timer is None:
+                logger.info("📴 Participant %s disconnected; waiting for reconnect", p.identity)
+                reconnect_timer = asyncio.get_running_loop().call_later(RECONNECT_GRACE_SECONDS, _end_after_grace)
 
-        # Greet the user
-        await session.say("Hi! I'm Alli. How can I help you today?", allow_interruptions=True)
+        @ctx.room.on("participant_connected")
+        def _on_participant_connected(p: rtc.RemoteParticipant):
+            nonlocal reconnect_timer
+            if p.identity == participant.identity and reconnect_timer is not None:
+                logger.info("🔁 Participant %s reconnected", p.identity)
+                reconnect_timer.cancel()
+                reconnect_timer = None
+
+        # Greet the user, replaying cached greeting audio when we have it
+        with tracer.start_as_current_span("session.say.greeting", context=call_context) as say_span:
+            greeting_audio = _load_greeting_audio(profile)
+            say_span.set_attribute("cached_audio", greeting_audio is not None)
+            if greeting_audio is not None:
+                await session.say(profile.greeting, audio=_replay(greeting_audio), allow_interruptions=True)
+            elif profile.prewarm:
+                await session.say(
+                    profile.greeting, audio=_synthesize_and_cache(tts, profile), allow_interruptions=True
+                )
+            else:
+                await session.say(profile.greeting, allow_interruptions=True)
+        call_span.end()
+        call_events.publish(room_name, "greeting_played")
         logger.info("💬 Greeted the participant")
 
         # Keep the session alive until the participant leaves or the session ends
@@ -169,9 +647,19 @@ async def entrypoint(ctx: JobContext):
         
     except asyncio.CancelledError:
         logger.info("Session cancelled")
+        if not session_started:
+            raise
     except Exception as e:
+        if call_span.is_recording():
+            call_span.record_exception(e)
+            call_span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+        if not session_started:
+            # Connect / session start failed: let the framework fail the job
+            raise
         logger.exception("Error during session: %s", e)
     finally:
+        if call_span.is_recording():
+            call_span.end()
         logger.info("👋 Entrypoint leaving for room: %s", room_name)
 
 # -------------------------
@@ -179,12 +667,40 @@ async def entrypoint(ctx: JobContext):
 # -------------------------
 if __name__ == "__main__":
     # Run the agent with worker options
-    cli.run_app(
-        WorkerOptions(
-            entrypoint_fnc=entrypoint,
-            prewarm_fnc=prewarm,
-            agent_name=os.getenv("AGENT_NAME", "voice-agent"),
-            # Enable auto-subscribe to all rooms
-            num_idle_processes=1,
+    worker_kwargs = {}
+    if MULTI_SESSION:
+        # Jobs run as threads of this process and share its prewarmed VAD;
+        # load is reported as used session slots so the server stops
+        # assigning jobs once the process is full.
+        worker_kwargs.update(
+            job_executor_type=JobExecutorType.THREAD,
+            load_threshold=1.0,
         )
+    # Lets job processes tag their markers with the worker they belong to
+    os.environ["ALLI_WORKER_PID"] = str(os.getpid())
+    signal.signal(signal.SIGUSR1, _on_drain_signal)
+    if os.getenv("ALLI_METRICS_PORT"):
+        from prometheus_client import CollectorRegistry, start_http_server
+
+        registry = None
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        start_http_server(int(os.getenv("ALLI_METRICS_PORT")), **({"registry": registry} if registry else {}))
+    atexit.register(worker_status.remove_report, _status_name)
+    options = WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        request_fnc=request_fnc,
+        drain_timeout=int(DRAIN_TIMEOUT_SECONDS),
+        agent_name=AGENT_NAME,
+        # Enable auto-subscribe to all rooms
+        num_idle_processes=1,
+        **worker_kwargs,
     )
+    # Wrap (rather than replace) the SDK's averaged, cgroup-aware load
+    _default_load_fnc = options.load_fnc
+    options.load_fnc = load_fnc
+    cli.run_app(options)
@@ -0,0 +1,60 @@
+# barge_in.py - Measures how fast the agent stops talking when the user interrupts
+from __future__ import annotations
+
+import logging
+import statistics
+
+logger = logging.getLogger("alli-voice-agent")
+
+
+class BargeInMonitor:
+    """
+    Records the stop latency of every interruption in a session.
+
+    An interruption starts when the user starts speaking (VAD onset) while
+    the agent is speaking, and ends when the agent leaves the ``speaking``
+    state, i.e. its audio output has stopped. Overlaps where the agent keeps
+    talking until the user is done are counted as ignored, not as latencies.
+    """
+
+    def __init__(self, room_name: str):
+        self.room_name = room_name
+        self.latencies: list[float] = []
+        self.ignored = 0
+        self._agent_speaking = False
+        self._onset: float | None = None
+
+    def attach(self, session):
+        session.on("user_state_changed", lambda ev: self.on_user_state(ev.new_state, ev.created_at))
+        session.on("agent_state_changed", lambda ev: self.on_agent_state(ev.new_state, ev.created_at))
+
+    def on_user_state(self, new_state: str, ts: float):
+        if new_state == "speaking":
+            if self._agent_speaking and self._onset is None:
+                self._onset = ts
+        elif self._onset is not None and self._agent_speaking:
+            # User finished talking and the agent never stopped
+            self._onset = None
+            self.ignored += 1
+
+    def on_agent_state(self, new_state: str, ts: float):
+        was_speaking = self._agent_speaking
+        self._agent_speaking = new_state == "speaking"
+        if was_speaking and not self._agent_speaking and self._onset is not None:
+            latency = max(0.0, ts - self._onset)
+            self._onset = None
+            self.latencies.append(latency)
+            logger.info("✋ Barge-in in room %s: agent audio stopped %.0f ms after user onset",
+                        self.room_name, latency * 1000)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return {"interruptions": 0, "ignored": self.ignored}
+        return {
+            "interruptions": len(ordered),
+            "ignored": self.ignored,
+            "p50_ms": round(statistics.median(ordered) * 1000, 1),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+        }
@@ -0,0 +1,144 @@
+# call_events.py - Call lifecycle events from workers to the token service
+"""
+Workers publish lifecycle events (agent_joined, session_started, ...) as
+small JSON datagrams to a local UDP port. The token service listens on that
+port and fans the events out to Server-Sent Events subscribers.
+
+UDP keeps publishing fire-and-forget: a worker never blocks or fails a call
+because the API is down, at the cost of an occasional lost event.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger("alli-voice-agent")
+
+EVENTS_HOST = os.getenv("ALLI_EVENTS_HOST", "127.0.0.1")
+EVENTS_PORT = int(os.getenv("ALLI_EVENTS_PORT", "8765"))
+
+ALL_ROOMS = "*"
+FINAL_EVENT = "session_ended"
+
+_sock: socket.socket | None = None
+
+
+def publish(room: str, event: str, **fields):
+    """Send one event to the token service (worker side, never raises)."""
+    global _sock
+    try:
+        if _sock is None:
+            _sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _sock.setblocking(False)
+        payload = json.dumps({"room": room, "event": event, "ts": time.time(), **fields}, separators=(",", ":"))
+        _sock.sendto(payload.encode("utf-8"), (EVENTS_HOST, EVENTS_PORT))
+    except OSError:
+        logger.debug("Dropped call event %s for room %s", event, room)
+
+
+class EventHub:
+    """
+    Per-room fan-out of call events to SSE subscribers.
+
+    Each event is encoded once and pushed with ``put_nowait`` onto every
+    subscriber's bounded queue; a subscriber that falls behind loses its
+    oldest events rather than slowing everyone else down. The last few
+    events of recent rooms are kept so late subscribers can catch up.
+    """
+
+    def __init__(self, *, queue_size: int = 64, history: int = 16, max_rooms: int = 10_000):
+        self.queue_size = queue_size
+        self.history = history
+        self.max_rooms = max_rooms
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._recent: OrderedDict[str, deque] = OrderedDict()
+        self._listeners: list = []
+        self._transport: asyncio.DatagramTransport | None = None
+
+    def add_listener(self, fn):
+        """Call ``fn(event)`` for every event, before it is fanned out."""
+        self._listeners.append(fn)
+
+    async def start(self, host: str = EVENTS_HOST, port: int = EVENTS_PORT):
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _EventProtocol(self), local_addr=(host, port)
+        )
+        logger.info("Listening for call events on udp://%s:%d", host, port)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def publish(self, event: dict):
+        room = event.get("room")
+        if not room:
+            return
+        for fn in self._listeners:
+            try:
+                fn(event)
+            except Exception:
+                logger.exception("Call event listener failed")
+        frame = f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n".encode("utf-8")
+
+        recent = self._recent.get(room)
+        if recent is None:
+            recent = self._recent[room] = deque(maxlen=self.history)
+            while len(self._recent) > self.max_rooms:
+                self._recent.popitem(last=False)
+        recent.append(frame)
+
+        for key in (room, ALL_ROOMS):
+            for queue in self._subscribers.get(key, ()):
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait((event.get("event"), frame))
+
+    async def stream(self, room: str = ALL_ROOMS, keepalive: float = 15.0):
+        """Yield SSE frames for a room (or all rooms) until the client goes away."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(room, set()).add(queue)
+        try:
+            if room != ALL_ROOMS:
+                for frame in list(self._recent.get(room, ())):
+                    yield frame
+                    if frame.startswith(f"event: {FINAL_EVENT}\n".encode("utf-8")):
+                        return
+            while True:
+                try:
+                    name, frame = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield frame
+                if room != ALL_ROOMS and name == FINAL_EVENT:
+                    return
+        finally:
+            subscribers = self._subscribers.get(room)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[room]
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+
+class _EventProtocol(asyncio.DatagramProtocol):
+    def __init__(self, hub: EventHub):
+        self.hub = hub
+
+    def datagram_received(self, data: bytes, addr):
+        try:
+            event = json.loads(data)
+        except ValueError:
+            return
+        if isinstance(event, dict):
+            self.hub.publish(event)
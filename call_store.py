@@ -0,0 +1,246 @@
+# call_store.py - Batched call-record store for the token service
+"""
+Handlers call ``store.record(...)``, which only appends to an in-memory
+queue. A background task drains the queue in batches and writes them to
+SQLite (WAL mode) on a worker thread, so request latency never includes
+disk I/O.
+
+Measure handler overhead and write amplification with:
+
+    python call_store.py bench --records 50000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("alli-voice-agent")
+
+CALL_DB_PATH = os.getenv("CALL_DB_PATH", "calls.db")
+
+_COLUMNS = ("created_at", "kind", "room", "agent_id", "agent_name", "participant_id", "dispatch_id", "user_id", "data")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_records (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    room TEXT,
+    agent_id TEXT,
+    agent_name TEXT,
+    participant_id TEXT,
+    dispatch_id TEXT,
+    user_id TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_call_records_room ON call_records (room);
+CREATE INDEX IF NOT EXISTS idx_call_records_agent_id_time ON call_records (agent_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_call_records_time ON call_records (created_at);
+"""
+
+# Queued by close(); the flush loop writes everything ahead of it and exits
+_STOP = object()
+
+
+class CallRecordStore:
+    def __init__(
+        self,
+        path: str = CALL_DB_PATH,
+        *,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        max_queue: int = 50_000,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._writer: sqlite3.Connection | None = None
+        self._reader: sqlite3.Connection | None = None
+        self._read_lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self.dropped = 0
+        self.written = 0
+
+    async def start(self):
+        await asyncio.to_thread(self._open)
+        self._task = asyncio.create_task(self._flush_loop())
+
+    def _open(self):
+        self._writer = sqlite3.connect(self.path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._writer.executescript(_SCHEMA)
+        self._writer.commit()
+        self._reader = sqlite3.connect(self.path, check_same_thread=False)
+        self._reader.row_factory = sqlite3.Row
+
+    def record(self, kind: str, **fields):
+        """Queue a record; never blocks and never touches disk."""
+        if self._closing:
+            self.dropped += 1
+            return
+        row = tuple(fields.pop(c, None) for c in _COLUMNS[2:-1])
+        extra = json.dumps(fields, separators=(",", ":"), default=str) if fields else None
+        try:
+            self._queue.put_nowait((time.time(), kind, *row, extra))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("Call record queue full; %d record(s) dropped so far", self.dropped)
+
+    async def _flush_loop(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            # Let a burst accumulate so it lands in a single transaction
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: list[tuple]):
+        try:
+            await asyncio.to_thread(self._write_sync, batch)
+            self.written += len(batch)
+        except Exception:
+            logger.exception("Failed to write %d call record(s)", len(batch))
+
+    def _write_sync(self, batch: list[tuple]):
+        with self._writer:
+            self._writer.executemany(
+                f"INSERT INTO call_records ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                batch,
+            )
+
+    async def close(self):
+        """Write whatever is still queued, then close the database."""
+        self._closing = True
+        if self._task is not None:
+            # Not cancelled: a cancelled task would leave its write thread
+            # running on the connection closed below
+            await self._queue.put(_STOP)
+            await self._task
+            self._task = None
+        for conn in (self._writer, self._reader):
+            if conn is not None:
+                conn.close()
+        self._writer = self._reader = None
+
+    async def query(
+        self,
+        *,
+        room: str | None = None,
+        agent_id: str | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        limit: int = 100,
+    ) -> list[dict]:
+        clauses, params = [], []
+        for column, value in (("room", room), ("agent_id", agent_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT * FROM call_records {where} ORDER BY created_at DESC LIMIT ?"
+        params.append(max(1, min(limit, 1000)))
+
+        def _run():
+            with self._read_lock:
+                rows = self._reader.execute(sql, params).fetchall()
+            records = []
+            for row in rows:
+                record = dict(row)
+                data = record.pop("data")
+                if data:
+                    record.update(json.loads(data))
+                records.append(record)
+            return records
+
+        return await asyncio.to_thread(_run)
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+async def _bench(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        store = CallRecordStore(path, batch_size=args.batch_size)
+        await store.start()
+
+        payload_bytes = 0
+        latencies = []
+        started = time.perf_counter()
+        for i in range(args.records):
+            fields = {
+                "room": f"room-agent-{i % 50}-{i:08x}",
+                "agent_id": f"agent-{i % 50}",
+                "agent_name": "voice-agent",
+                "participant_id": f"participant-agent-{i % 50}-{i:08x}",
+                "dispatch_id": f"AD_{i:012x}",
+            }
+            payload_bytes += sum(len(v) for v in fields.values()) + 16
+            t0 = time.perf_counter_ns()
+            store.record("start_call", **fields)
+            latencies.append(time.perf_counter_ns() - t0)
+            if i % 1000 == 999:
+                await asyncio.sleep(0)  # let the flusher run, as between requests
+        enqueue_done = time.perf_counter()
+        await store.close()
+        flushed = time.perf_counter()
+
+        disk_bytes = sum(
+            os.path.getsize(p) for p in (path, f"{path}-wal", f"{path}-shm") if os.path.exists(p)
+        )
+
+    latencies.sort()
+    print(f"records:            {args.records} (dropped {store.dropped})")
+    print(f"record() p50/p99:   {latencies[len(latencies) // 2] / 1e3:.1f} / {latencies[int(len(latencies) * 0.99)] / 1e3:.1f} us")
+    print(f"record() mean:      {statistics.fmean(latencies) / 1e3:.1f} us")
+    print(f"enqueue wall time:  {enqueue_done - started:.3f} s")
+    print(f"total incl. flush:  {flushed - started:.3f} s ({args.records / (flushed - started):.0f} rows/s)")
+    print(f"payload bytes:      {payload_bytes}")
+    print(f"on-disk bytes:      {disk_bytes} (write amplification ~{disk_bytes / payload_bytes:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Call record store tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="Measure handler overhead and write amplification")
+    bench.add_argument("--records", type=int, default=50_000)
+    bench.add_argument("--batch-size", type=int, default=500)
+    bench.set_defaults(func=_bench)
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
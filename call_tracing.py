@@ -0,0 +1,184 @@
+# call_tracing.py - Per-call tracing shared by the token service and the agent worker
+"""
+One trace per call, from ``/start_call`` to the agent's first utterance.
+
+The token service opens the trace and passes its W3C ``traceparent`` (plus the
+dispatch timestamp) to the worker in the dispatch metadata; the worker
+continues the same trace. Spans are exported over OTLP when
+``OTEL_EXPORTER_OTLP_ENDPOINT`` is set, otherwise appended as JSON lines to
+``ALLI_TRACE_DIR``.
+
+Report the slowest calls from the local files with:
+
+    python call_tracing.py report --top 10
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+logger = logging.getLogger("alli-voice-agent")
+
+TRACING_ENABLED = os.getenv("ALLI_TRACING", "0") == "1"
+TRACE_DIR = os.getenv("ALLI_TRACE_DIR", "traces")
+
+_propagator = TraceContextTextMapPropagator()
+_providers: dict[str, TracerProvider] = {}
+_lock = threading.Lock()
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Append finished spans to ``<TRACE_DIR>/<service>-<pid>.jsonl``."""
+
+    def __init__(self, service_name: str, directory: str = TRACE_DIR):
+        self.directory = directory
+        self.service_name = service_name
+
+    def export(self, spans) -> SpanExportResult:
+        lines = []
+        for span in spans:
+            parent = span.parent
+            lines.append(json.dumps({
+                "trace_id": format(span.context.trace_id, "032x"),
+                "span_id": format(span.context.span_id, "016x"),
+                "parent_id": format(parent.span_id, "016x") if parent else None,
+                "name": span.name,
+                "service": self.service_name,
+                "start": span.start_time,
+                "end": span.end_time,
+                "attributes": dict(span.attributes or {}),
+            }, separators=(",", ":")))
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{self.service_name}-{os.getpid()}.jsonl")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError:
+            logger.exception("Failed to write trace spans")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def get_tracer(service_name: str) -> trace.Tracer:
+    """
+    Return a tracer for this process.
+
+    The provider is kept private (not installed globally) so it does not
+    interfere with telemetry configured by the LiveKit SDK.
+    """
+    if not TRACING_ENABLED:
+        return trace.NoOpTracer()
+
+    with _lock:
+        provider = _providers.get(service_name)
+        if provider is None:
+            provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+            if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+                exporter = OTLPSpanExporter()
+            else:
+                exporter = JsonlSpanExporter(service_name)
+            provider.add_span_processor(BatchSpanProcessor(exporter))
+            _providers[service_name] = provider
+    return provider.get_tracer("alli-voice-agent")
+
+
+def flush():
+    """Export pending spans; call before a job process exits."""
+    for provider in list(_providers.values()):
+        provider.force_flush()
+
+
+def inject(span: trace.Span) -> dict:
+    """Trace fields to embed in dispatch metadata."""
+    carrier: dict[str, str] = {}
+    _propagator.inject(carrier, context=trace.set_span_in_context(span))
+    if carrier:
+        carrier["dispatched_at"] = time.time_ns()
+    return carrier
+
+
+def extract(metadata: dict):
+    """Parent context carried in dispatch metadata (empty context if absent)."""
+    return _propagator.extract({k: v for k, v in metadata.items() if isinstance(v, str)})
+
+
+# -------------------------
+# Slowest-call report
+# -------------------------
+def load_spans(directory: str = TRACE_DIR) -> dict[str, list[dict]]:
+    traces: dict[str, list[dict]] = defaultdict(list)
+    for path in glob.glob(os.path.join(directory, "*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if span.get("start") and span.get("end"):
+                    traces[span["trace_id"]].append(span)
+    return traces
+
+
+def slowest_calls(traces: dict[str, list[dict]], top: int = 10) -> list[dict]:
+    calls = []
+    for trace_id, spans in traces.items():
+        spans.sort(key=lambda s: s["start"])
+        start = spans[0]["start"]
+        room = next((s["attributes"].get("room") for s in spans if s["attributes"].get("room")), None)
+        calls.append({
+            "trace_id": trace_id,
+            "room": room,
+            "total_ms": (max(s["end"] for s in spans) - start) / 1e6,
+            "spans": [
+                {
+                    "name": s["name"],
+                    "offset_ms": (s["start"] - start) / 1e6,
+                    "duration_ms": (s["end"] - s["start"]) / 1e6,
+                }
+                for s in spans
+            ],
+        })
+    calls.sort(key=lambda c: c["total_ms"], reverse=True)
+    return calls[:top]
+
+
+def _report(args):
+    calls = slowest_calls(load_spans(args.dir), args.top)
+    if not calls:
+        print(f"No complete traces found in {args.dir}")
+        return
+    for call in calls:
+        print(f"{call['total_ms']:9.1f} ms  room={call['room']}  trace={call['trace_id']}")
+        for s in call["spans"]:
+            print(f"    +{s['offset_ms']:8.1f} ms  {s['duration_ms']:8.1f} ms  {s['name']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Call trace tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="Show the slowest call paths")
+    report.add_argument("--dir", default=TRACE_DIR)
+    report.add_argument("--top", type=int, default=10)
+    report.set_defaults(func=_report)
+    args = parser.parse_args()
+    args.func(args)
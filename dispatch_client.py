@@ -0,0 +1,347 @@
+# dispatch_client.py - Timeouts, retries, hedging and a circuit breaker around create_dispatch
+"""
+``ResilientDispatcher.create_dispatch`` wraps the LiveKit AgentDispatch
+service:
+
+- every attempt has its own timeout;
+- failed attempts are retried with full-jitter exponential backoff (client
+  errors are not retried);
+- once enough latencies are known, an attempt that is slower than the
+  configured percentile gets a hedged second attempt, and whichever
+  finishes first wins;
+- a circuit breaker fails fast while the API keeps failing.
+
+Room names are unique per call, so a retried or hedged attempt can only
+create a duplicate dispatch for the same room. Abandoning a request on the
+client does not stop the server from creating it, so losing hedges are
+left to finish (within ``attempt_timeout``) and their dispatches deleted;
+after a timed-out attempt the room's dispatches are listed again once it
+has had time to land, and extras deleted. This runs in the background and
+narrows, but cannot fully close, the window in which a room has two
+agents.
+
+Exercise it against a local stub that injects latency and errors with:
+
+    python dispatch_client.py --calls 500 --error-rate 0.1 --slow-rate 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+
+from livekit.api.twirp_client import TwirpError
+
+logger = logging.getLogger("alli-voice-agent")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; lets one trial call through after ``reset_timeout``."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        """Give up a half-open trial that ended without a result (e.g. cancelled)."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("⚡ Dispatch circuit opened after %d consecutive failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+def _is_retryable(e: BaseException) -> bool:
+    if isinstance(e, TwirpError):
+        return (getattr(e, "status", None) or 500) >= 500
+    return True
+
+
+class ResilientDispatcher:
+    def __init__(
+        self,
+        *,
+        attempt_timeout: float = 2.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.1,
+        backoff_max: float = 1.0,
+        hedge_percentile: float | None = None,
+        hedge_min_samples: int = 20,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies: deque[float] = deque(maxlen=200)
+        self.hedges = 0
+        self.retries = 0
+        self._cleanups: set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls) -> "ResilientDispatcher":
+        percentile = float(os.getenv("DISPATCH_HEDGE_PERCENTILE", "0"))
+        return cls(
+            attempt_timeout=float(os.getenv("DISPATCH_TIMEOUT_SECONDS", "2.0")),
+            max_attempts=int(os.getenv("DISPATCH_MAX_ATTEMPTS", "3")),
+            backoff_base=float(os.getenv("DISPATCH_BACKOFF_BASE_SECONDS", "0.1")),
+            backoff_max=float(os.getenv("DISPATCH_BACKOFF_MAX_SECONDS", "1.0")),
+            hedge_percentile=percentile or None,
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("DISPATCH_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("DISPATCH_BREAKER_RESET_SECONDS", "10")),
+            ),
+        )
+
+    def _hedge_delay(self) -> float | None:
+        if not self.hedge_percentile or len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        delay = ordered[index]
+        return delay if delay < self.attempt_timeout else None
+
+    async def _timed_call(self, service, request):
+        started = time.monotonic()
+        result = await asyncio.wait_for(service.create_dispatch(request), timeout=self.attempt_timeout)
+        self._latencies.append(time.monotonic() - started)
+        return result
+
+    async def _attempt(self, service, request) -> tuple[object, set[asyncio.Task], bool]:
+        """
+        One (possibly hedged) attempt.
+
+        Returns the dispatch, the losing request still in flight (if any) and
+        whether a failed request may still have created a dispatch.
+        """
+        primary = asyncio.create_task(self._timed_call(service, request))
+        delay = self._hedge_delay()
+        if delay is None:
+            return await primary, set(), False
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result(), set(), False
+
+        self.hedges += 1
+        hedge = asyncio.create_task(self._timed_call(service, request))
+        pending = {primary, hedge}
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    # Not cancelled: the server may create it anyway
+                    return task.result(), pending, error is not None and _is_retryable(error)
+                error = task.exception()
+        raise error
+
+    async def create_dispatch(self, service, request):
+        """Create a dispatch through ``service`` (e.g. ``LiveKitAPI.agent_dispatch``)."""
+        trial = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            raise CircuitOpenError("LiveKit dispatch API is unhealthy; failing fast")
+
+        maybe_duplicated = False
+        last_error: BaseException | None = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.retries += 1
+                backoff = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                await asyncio.sleep(random.uniform(0, backoff))
+                trial = self.breaker.state == "half_open"
+                if not self.breaker.allow():
+                    raise CircuitOpenError("LiveKit dispatch API is unhealthy; failing fast") from last_error
+            try:
+                dispatch, losers, ambiguous = await self._attempt(service, request)
+            except Exception as e:
+                last_error = e
+                # A timed-out or dropped request may still have created a dispatch
+                logger.warning("Dispatch attempt %d/%d for room %s failed: %r",
+                               attempt + 1, self.max_attempts, request.room, e)
+                if not _is_retryable(e):
+                    # A client error means the API is up; it must not open the breaker
+                    self.breaker.record_success()
+                    raise
+                maybe_duplicated = True
+                self.breaker.record_failure()
+                continue
+            except BaseException:
+                # Cancelled: otherwise the breaker would wait forever for this trial's result
+                if trial:
+                    self.breaker.release_trial()
+                raise
+
+            self.breaker.record_success()
+            if losers or maybe_duplicated or ambiguous:
+                task = asyncio.create_task(
+                    self._delete_duplicates(service, request, dispatch, losers, maybe_duplicated or ambiguous)
+                )
+                self._cleanups.add(task)
+                task.add_done_callback(self._cleanups.discard)
+            return dispatch
+
+        raise last_error
+
+    async def _delete_duplicates(self, service, request, winner, losers: set[asyncio.Task], relist: bool):
+        try:
+            for task in losers:
+                try:
+                    loser = await task
+                except Exception as e:
+                    relist = relist or _is_retryable(e)
+                    continue
+                await service.delete_dispatch(loser.id, request.room)
+                logger.info("Deleted losing hedged dispatch %s for room %s", loser.id, request.room)
+
+            if not relist:
+                return
+            # Give a request abandoned on the client time to land server-side
+            await asyncio.sleep(self.attempt_timeout)
+            for dispatch in await service.list_dispatch(request.room):
+                if dispatch.id != winner.id and dispatch.agent_name == request.agent_name:
+                    await service.delete_dispatch(dispatch.id, request.room)
+                    logger.info("Deleted duplicate dispatch %s for room %s", dispatch.id, request.room)
+        except Exception:
+            logger.exception("Failed to clean up duplicate dispatches for room %s", request.room)
+
+    async def close(self):
+        """Wait for background duplicate cleanups to finish."""
+        if self._cleanups:
+            await asyncio.gather(*self._cleanups, return_exceptions=True)
+
+
+# -------------------------
+# Local stub simulation
+# -------------------------
+class _StubDispatch:
+    def __init__(self, id: str, room: str, agent_name: str):
+        self.id, self.room, self.agent_name = id, room, agent_name
+
+
+class _StubRequest:
+    def __init__(self, room: str, agent_name: str = "voice-agent"):
+        self.room, self.agent_name = room, agent_name
+
+
+class _StubDispatchService:
+    """In-memory AgentDispatch service that injects latency and errors."""
+
+    def __init__(self, *, base_latency: float, slow_rate: float, slow_latency: float, error_rate: float):
+        self.base_latency = base_latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.dispatches: dict[str, list[_StubDispatch]] = {}
+        self.calls = 0
+
+    async def create_dispatch(self, request):
+        # Like the real server, a request the client abandons (timeout or
+        # cancel) still completes server-side
+        return await asyncio.shield(asyncio.ensure_future(self._create(request)))
+
+    async def _create(self, request):
+        self.calls += 1
+        slow = random.random() < self.slow_rate
+        await asyncio.sleep(self.slow_latency if slow else random.uniform(0.5, 1.5) * self.base_latency)
+        if random.random() < self.error_rate:
+            raise ConnectionError("injected failure")
+        dispatch = _StubDispatch(f"AD_{self.calls:06d}", request.room, request.agent_name)
+        self.dispatches.setdefault(request.room, []).append(dispatch)
+        return dispatch
+
+    async def list_dispatch(self, room_name):
+        return list(self.dispatches.get(room_name, []))
+
+    async def delete_dispatch(self, dispatch_id, room_name):
+        self.dispatches[room_name] = [d for d in self.dispatches.get(room_name, []) if d.id != dispatch_id]
+
+
+async def _simulate(args):
+    service = _StubDispatchService(
+        base_latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency, error_rate=args.error_rate
+    )
+    dispatcher = ResilientDispatcher(
+        attempt_timeout=args.timeout,
+        max_attempts=args.attempts,
+        hedge_percentile=args.hedge_percentile or None,
+        breaker=CircuitBreaker(failure_threshold=args.breaker_failures, reset_timeout=1.0),
+    )
+    latencies, failures, fast_fails = [], 0, 0
+    for i in range(args.calls):
+        started = time.monotonic()
+        try:
+            await dispatcher.create_dispatch(service, _StubRequest(f"room-sim-{i:06d}"))
+            latencies.append(time.monotonic() - started)
+        except CircuitOpenError:
+            fast_fails += 1
+        except Exception:
+            failures += 1
+
+    await dispatcher.close()
+    # Count requests abandoned by the client that landed after the cleanup
+    await asyncio.sleep(args.slow_latency)
+    duplicates = sum(max(0, len(d) - 1) for d in service.dispatches.values())
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float("nan")
+
+    print(f"calls:        {args.calls}  succeeded={len(latencies)} failed={failures} fast-failed={fast_fails}")
+    print(f"latency ms:   p50={pct(0.50):.1f} p95={pct(0.95):.1f} p99={pct(0.99):.1f} max={pct(1.0):.1f}")
+    print(f"api requests: {service.calls}  retries={dispatcher.retries} hedges={dispatcher.hedges}")
+    print(f"duplicates left: {duplicates}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate dispatch resilience against a stub API")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="typical API latency (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--hedge-percentile", type=float, default=95)
+    parser.add_argument("--breaker-failures", type=int, default=5)
+    asyncio.run(_simulate(parser.parse_args()))
@@ -1,17 +1,32 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
+import hmac
 import json
 import os
+import time
+from collections import OrderedDict
+from datetime import timedelta
 from uuid import uuid4
+import jwt
 from livekit.api import AccessToken, VideoGrants, LiveKitAPI
 from livekit.protocol import agent as proto_agent
 from google.protobuf.json_format import MessageToDict
 from dotenv import load_dotenv
 from livekit import api
-from livekit.api import access_token as atoken
 from livekit.protocol import agent_dispatch as proto_agent
+from opentelemetry import trace
+from prometheus_client import make_asgi_app
+
+import call_events
+import call_store
+import call_tracing
+import dispatch_client
+import room_reaper
+import worker_status
 
 load_dotenv()
 
@@ -20,13 +35,119 @@ LIVEKIT_URL = os.getenv("LIVEKIT_URL")
 LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY")
 LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET")
 AGENT_NAME = os.getenv("AGENT_NAME")
+# Worker pools this service may dispatch to, in order of preference
+AGENT_NAMES = [n.strip() for n in os.getenv("AGENT_NAMES", AGENT_NAME or "").split(",") if n.strip()]
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Lifetime of participant tokens; clients reconnect via /refresh_token
+TOKEN_TTL_SECONDS = int(os.getenv("LIVEKIT_TOKEN_TTL_SECONDS", "600"))
+# How long after expiry a token may still be exchanged for a fresh one
+TOKEN_REFRESH_GRACE_SECONDS = int(os.getenv("LIVEKIT_TOKEN_REFRESH_GRACE_SECONDS", "3600"))
+# No token is issued past this long after the call started, however often it is refreshed
+MAX_CALL_SECONDS = int(os.getenv("LIVEKIT_MAX_CALL_SECONDS", "7200"))
+
+tracer = call_tracing.get_tracer("alli-token-service")
+
+# Set by POST /drain before a deploy; /health then reports 503 so the load
+# balancer stops sending new calls while in-flight requests complete.
+draining = False
+
+
+def build_participant_token(
+    room_name: str,
+    participant_id: str,
+    metadata: dict,
+    call_started_at: float,
+    ttl: float = TOKEN_TTL_SECONDS,
+) -> str:
+    """
+    Sign a short-lived LiveKit JWT that lets one participant join one room.
+
+    The call's start time travels in the metadata so /refresh_token can
+    enforce MAX_CALL_SECONDS across refreshes.
+    """
+    token_builder = AccessToken(api_key=LIVEKIT_API_KEY, api_secret=LIVEKIT_API_SECRET)
+    token_builder = token_builder.with_identity(participant_id)
+    token_builder = token_builder.with_grants(VideoGrants(room_join=True, room=room_name))
+    token_builder = token_builder.with_metadata(json.dumps({**metadata, "call_started_at": call_started_at}))
+    token_builder = token_builder.with_ttl(timedelta(seconds=ttl))
+    return token_builder.to_jwt()
+
+
+# Workers refresh their reports every few seconds; re-reading them once a
+# second is plenty
+REPORTS_CACHE_SECONDS = 1.0
+_reports_cache: tuple[float, list[dict]] = (0.0, [])
+
+
+def pick_agent_name() -> str | None:
+    """Pick the worker pool to dispatch to from the workers' load reports."""
+    if len(AGENT_NAMES) <= 1:
+        return AGENT_NAMES[0] if AGENT_NAMES else AGENT_NAME
+    global _reports_cache
+    read_at, reports = _reports_cache
+    if time.monotonic() - read_at > REPORTS_CACHE_SECONDS:
+        reports = worker_status.read_reports()
+        _reports_cache = (time.monotonic(), reports)
+    name = worker_status.choose_pool(AGENT_NAMES, reports)
+    worker_status.note_dispatch(reports, name)
+    return name
+
+
+# Fan-out of call lifecycle events published by workers
+event_hub = call_events.EventHub()
+# Rooms, participants and dispatches created by this service
+call_records = call_store.CallRecordStore()
+# Deletes rooms (and their dispatches) that nobody joined within the TTL
+reaper = room_reaper.RoomReaper(
+    on_reap=lambda room: event_hub.publish({"room": room, "event": "room_reaped", "ts": time.time()})
+)
+# Timeouts, retries, hedging and circuit breaking for create_dispatch
+dispatcher = dispatch_client.ResilientDispatcher.from_env()
+
+
+# Rooms whose call has ended (session over or room reaped); /refresh_token
+# refuses them, since joining would only recreate an empty room
+MAX_ENDED_ROOMS = 10_000
+_ended_rooms: OrderedDict[str, float] = OrderedDict()
+
+
+def _on_call_event(event: dict):
+    # A joined or finished room no longer needs to be watched
+    if event.get("event") in ("participant_joined", call_events.FINAL_EVENT):
+        reaper.forget(event["room"])
+    if event.get("event") in (call_events.FINAL_EVENT, "room_reaped"):
+        _ended_rooms[event["room"]] = time.time()
+        while len(_ended_rooms) > MAX_ENDED_ROOMS:
+            _ended_rooms.popitem(last=False)
+
+
+event_hub.add_listener(_on_call_event)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await event_hub.start()
+    await call_records.start()
+    await reaper.start(LIVEKIT_URL, LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+    try:
+        yield
+    finally:
+        await reaper.close()
+        await dispatcher.close()
+        await call_records.close()
+        event_hub.close()
+
 
 app = FastAPI(
     title="Alli Voice Agent API",
     description="FastAPI base project for voice agent",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Prometheus metrics (reaper counters, ...)
+app.mount("/metrics", make_asgi_app())
+
 # CORS middleware configuration
 app.add_middleware(
     CORSMiddleware,
@@ -45,10 +166,73 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (503 while draining)"""
+    if draining:
+        return JSONResponse(status_code=503, content={"status": "draining"})
     return {"status": "healthy"}
 
 
+def _admin_error(x_admin_token: str | None) -> JSONResponse | None:
+    # Admin endpoints are disabled unless ADMIN_TOKEN is configured
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        return JSONResponse(status_code=403, content={"status": "error", "message": "Forbidden"})
+    return None
+
+
+@app.post("/drain")
+async def drain(x_admin_token: str | None = Header(default=None)):
+    """Start draining this instance ahead of a restart"""
+    global draining
+    if (error := _admin_error(x_admin_token)) is not None:
+        return error
+    draining = True
+    return {"status": "draining"}
+
+
+@app.post("/undrain")
+async def undrain(x_admin_token: str | None = Header(default=None)):
+    """Cancel draining; /health reports healthy again"""
+    global draining
+    if (error := _admin_error(x_admin_token)) is not None:
+        return error
+    draining = False
+    return {"status": "ok"}
+
+
+@app.get("/workers")
+async def workers():
+    """Current status reports of agent workers"""
+    return {"status": "success", "data": worker_status.read_reports()}
+
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@app.get("/calls/{room_name}/events")
+async def call_events_stream(room_name: str):
+    """Server-Sent Events stream of lifecycle events for one room"""
+    return StreamingResponse(event_hub.stream(room_name), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@app.get("/events")
+async def all_events_stream():
+    """Server-Sent Events stream of lifecycle events for all rooms (dashboards)"""
+    return StreamingResponse(event_hub.stream(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@app.get("/calls")
+async def list_calls(
+    room: str | None = None,
+    agent_id: str | None = None,
+    since: float | None = Query(default=None, description="Unix timestamp (inclusive)"),
+    until: float | None = Query(default=None, description="Unix timestamp (exclusive)"),
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """Query call records, newest first"""
+    records = await call_records.query(room=room, agent_id=agent_id, since=since, until=until, limit=limit)
+    return {"status": "success", "data": records}
+
+
 class StartCallRequest(BaseModel):
     agent_id: str
 
@@ -65,12 +249,15 @@ async def get_livekit_token(data: StartCallRequest):
         - participantId: Generated participant ID
         - dispatch: Agent dispatch information
     """
+    call_span = tracer.start_span("start_call", attributes={"agent_id": data.agent_id})
     try:
         agent_id = data.agent_id
 
         # Generate unique room and participant identifiers
         room_name = f"room-{agent_id}-{uuid4().hex[:8]}"
         participant_id = f"participant-{agent_id}-{uuid4().hex[:8]}"
+        call_span.set_attribute("room", room_name)
+        call_context = trace.set_span_in_context(call_span)
 
         # Create LiveKit API client
         lk = LiveKitAPI(
@@ -81,28 +268,39 @@ async def get_livekit_token(data: StartCallRequest):
 
         # Create agent dispatch - This tells the worker to join this room
         dispatch_request = proto_agent.CreateAgentDispatchRequest(
-            agent_name=AGENT_NAME,
+            agent_name=pick_agent_name(),
             room=room_name,
-            metadata=json.dumps({"client": "voice-agent", "agent_id": agent_id}),
+            metadata=json.dumps({
+                "client": "voice-agent",
+                "agent_id": agent_id,
+                **call_tracing.inject(call_span),
+            }),
         )
-        created_dispatch = await lk.agent_dispatch.create_dispatch(dispatch_request)
+        with tracer.start_as_current_span("dispatch.create", context=call_context):
+            created_dispatch = await dispatcher.create_dispatch(lk.agent_dispatch, dispatch_request)
+        event_hub.publish({"room": room_name, "event": "dispatched", "ts": time.time(), "agent_id": agent_id})
         
         # Convert dispatch to dict for response
         dispatch_dict = MessageToDict(created_dispatch, preserving_proto_field_name=True)
 
         # Generate participant token
-        token_builder = AccessToken(
-            api_key=LIVEKIT_API_KEY,
-            api_secret=LIVEKIT_API_SECRET
-        )
-        token_builder = token_builder.with_identity(participant_id)
-        token_builder = token_builder.with_grants(
-            VideoGrants(room_join=True, room=room_name)
-        )
-        token_builder = token_builder.with_metadata(
-            json.dumps({"client": "voice-agent", "agent_id": agent_id})
+        with tracer.start_as_current_span("token.mint", context=call_context):
+            jwt_token = build_participant_token(
+                room_name,
+                participant_id,
+                {"client": "voice-agent", "agent_id": agent_id},
+                call_started_at=time.time(),
+            )
+
+        reaper.track(room_name, created_dispatch.id)
+        call_records.record(
+            "start_call",
+            room=room_name,
+            agent_id=agent_id,
+            agent_name=dispatch_request.agent_name,
+            participant_id=participant_id,
+            dispatch_id=created_dispatch.id,
         )
-        jwt_token = token_builder.to_jwt()
 
         return {
             "status": "success",
@@ -115,12 +313,87 @@ async def get_livekit_token(data: StartCallRequest):
                 "dispatch": dispatch_dict,
             }
         }
+    except dispatch_client.CircuitOpenError as e:
+        call_span.record_exception(e)
+        call_span.set_status(trace.Status(trace.StatusCode.ERROR))
+        return {
+            "status": "error",
+            "message": "Agent dispatch is temporarily unavailable, please retry shortly",
+            "retryable": True,
+        }
     except Exception as e:
+        call_span.record_exception(e)
+        call_span.set_status(trace.Status(trace.StatusCode.ERROR))
         return {
             "status": "error",
             "message": f"Failed to generate token: {str(e)}"
         }
+    finally:
+        call_span.end()
+
+
+
+class RefreshTokenRequest(BaseModel):
+    roomName: str
+    participantId: str
+    token: str
+
+
+@app.post("/refresh_token")
+async def refresh_token(data: RefreshTokenRequest):
+    """
+    Issue a fresh token for a participant rejoining an existing call
+
+    The previous token (which may have expired up to
+    LIVEKIT_TOKEN_REFRESH_GRACE_SECONDS ago) proves the caller owned the
+    identity in that room. No room or dispatch is created, so the running
+    agent session keeps its state. Calls that have ended, or that started
+    more than LIVEKIT_MAX_CALL_SECONDS ago, cannot be refreshed.
+    """
+    try:
+        claims = jwt.decode(
+            data.token,
+            LIVEKIT_API_SECRET,
+            algorithms=["HS256"],
+            issuer=LIVEKIT_API_KEY,
+            options={"verify_exp": False, "require": ["exp", "sub"]},
+        )
+    except jwt.InvalidTokenError as e:
+        return JSONResponse(status_code=401, content={"status": "error", "message": f"Invalid token: {e}"})
 
+    video = claims.get("video") or {}
+    if claims["sub"] != data.participantId or video.get("room") != data.roomName or not video.get("roomJoin"):
+        return JSONResponse(status_code=403, content={"status": "error", "message": "Token does not match room and participant"})
+    if claims["exp"] + TOKEN_REFRESH_GRACE_SECONDS < time.time():
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Token too old to refresh; start a new call"})
+    if data.roomName in _ended_rooms:
+        return JSONResponse(status_code=410, content={"status": "error", "message": "Call has ended; start a new call"})
+
+    try:
+        metadata = json.loads(claims.get("metadata") or "{}")
+    except ValueError:
+        metadata = {}
+    if not isinstance(metadata, dict):
+        metadata = {}
+    # Tokens minted before call_started_at was added are all first-generation
+    call_started_at = float(metadata.get("call_started_at") or claims.get("nbf") or 0)
+    remaining = call_started_at + MAX_CALL_SECONDS - time.time()
+    if remaining <= 0:
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Call reached its maximum length; start a new call"})
+
+    ttl = max(1, min(TOKEN_TTL_SECONDS, int(remaining)))
+    jwt_token = build_participant_token(data.roomName, data.participantId, metadata, call_started_at, ttl=ttl)
+    return {
+        "status": "success",
+        "message": "Token refreshed successfully",
+        "data": {
+            "token": jwt_token,
+            "url": LIVEKIT_URL,
+            "roomName": data.roomName,
+            "participantId": data.participantId,
+            "expiresIn": ttl,
+        }
+    }
 
 
 @app.post("/start_call2")
@@ -142,26 +415,38 @@ async def get_token2(data: StartCallRequest):
     room_name = f"room-{agent_id}-{uuid4().hex[:8]}"
     participant_id = f"participant-{agent_id}-{uuid4().hex[:8]}"
 
-    # Create dispatch
-    req = proto_agent.CreateAgentDispatchRequest(
-        agent_name=AGENT_NAME,
-        room=room_name,
-        metadata=json.dumps({"user_id": user_id, "agent_id": agent_id}),
-    )
-    created_dispatch = await lk.agent_dispatch.create_dispatch(req)
+    with tracer.start_as_current_span("start_call", attributes={"agent_id": agent_id, "room": room_name}) as call_span:
+        # Create dispatch
+        req = proto_agent.CreateAgentDispatchRequest(
+            agent_name=pick_agent_name(),
+            room=room_name,
+            metadata=json.dumps({"user_id": user_id, "agent_id": agent_id, **call_tracing.inject(call_span)}),
+        )
+        with tracer.start_as_current_span("dispatch.create"):
+            created_dispatch = await dispatcher.create_dispatch(lk.agent_dispatch, req)
+        event_hub.publish({"room": room_name, "event": "dispatched", "ts": time.time(), "agent_id": agent_id})
 
-    # Convert to dict for JSON response
-    created_dispatch_dict = MessageToDict(created_dispatch, preserving_proto_field_name=True)
+        # Convert to dict for JSON response
+        created_dispatch_dict = MessageToDict(created_dispatch, preserving_proto_field_name=True)
 
-    # Generate participant token
-    token_builder = atoken.AccessToken(api_key=LIVEKIT_API_KEY, api_secret=LIVEKIT_API_SECRET)
-    token_builder = token_builder.with_identity(participant_id)
-    token_builder = token_builder.with_grants(atoken.VideoGrants(room_join=True, room=room_name))
-    token_builder = token_builder.with_metadata(json.dumps({"client": "playground", "role": "tester"}))
-    jwt_token = token_builder.to_jwt()
+        # Generate participant token
+        with tracer.start_as_current_span("token.mint"):
+            jwt_token = build_participant_token(
+                room_name, participant_id, {"client": "playground", "role": "tester"}, call_started_at=time.time()
+            )
 
-    # Store in DB
+    reaper.track(room_name, created_dispatch.id)
 
+    # Store in DB (queued; flushed in the background)
+    call_records.record(
+        "start_call2",
+        room=room_name,
+        agent_id=agent_id,
+        agent_name=req.agent_name,
+        participant_id=participant_id,
+        dispatch_id=created_dispatch.id,
+        user_id=user_id,
+    )
 
     return {
         "status": "success",
@@ -184,5 +469,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8003,
         reload=True,
-        log_level="info"
+        log_level="info",
+        timeout_graceful_shutdown=int(os.getenv("SHUTDOWN_GRACE_SECONDS", "30")),
     )
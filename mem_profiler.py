@@ -0,0 +1,189 @@
+# mem_profiler.py - Opt-in tracemalloc profiling for worker processes
+"""
+With ``ALLI_MEMPROFILE=1`` every session takes a tracemalloc snapshot when
+it starts and diffs against it when it ends (and whenever the process gets
+``SIGUSR2``; the handler only schedules the report on a worker thread). Reports list the allocation sites that grew the most and are
+written to ``ALLI_MEMPROFILE_DIR`` with the room name in the file name.
+
+Process RSS, live session count and the largest allocation sites are
+exported as Prometheus gauges regardless; set ``PROMETHEUS_MULTIPROC_DIR``
+so gauges from job processes are visible on the worker's metrics port.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import signal
+import threading
+import time
+import tracemalloc
+
+import psutil
+from prometheus_client import Gauge
+
+logger = logging.getLogger("alli-voice-agent")
+
+ENABLED = os.getenv("ALLI_MEMPROFILE", "0") == "1"
+FRAMES = int(os.getenv("ALLI_MEMPROFILE_FRAMES", "1"))
+TOP_N = int(os.getenv("ALLI_MEMPROFILE_TOP", "25"))
+REPORT_DIR = os.getenv("ALLI_MEMPROFILE_DIR", "memprofiles")
+
+RSS_BYTES = Gauge("alli_worker_rss_bytes", "Resident set size of the process", multiprocess_mode="all")
+LIVE_SESSIONS = Gauge("alli_live_sessions", "Agent sessions currently running", multiprocess_mode="livesum")
+TOP_ALLOCATIONS = Gauge(
+    "alli_top_allocation_bytes",
+    "Bytes held by the largest allocation sites (ALLI_MEMPROFILE=1 only)",
+    ["site"],
+    multiprocess_mode="all",
+)
+
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+_profilers: set["SessionProfiler"] = set()
+_lock = threading.Lock()
+_process = psutil.Process()
+_published_sites: set[str] = set()
+_MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+_signal_loop: asyncio.AbstractEventLoop | None = None
+_signal_tasks: set[asyncio.Future] = set()
+
+
+def start():
+    """Start tracing allocations (call as early as possible, e.g. in prewarm)."""
+    if ENABLED and not tracemalloc.is_tracing():
+        tracemalloc.start(FRAMES)
+        logger.info("🧠 tracemalloc started (%d frame(s))", FRAMES)
+
+
+def update_process_metrics():
+    try:
+        RSS_BYTES.set(_process.memory_info().rss)
+    except psutil.Error:
+        pass
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_FILTERS)
+
+
+def _site(stat) -> str:
+    # Parent directory + file name is enough to tell e.g. agents/ from plugins/
+    frame = stat.traceback[0]
+    parts = frame.filename.replace("\\", "/").rsplit("/", 2)
+    return f"{'/'.join(parts[-2:])}:{frame.lineno}"
+
+
+def _publish_top(snapshot: tracemalloc.Snapshot):
+    top = {_site(stat): stat.size for stat in snapshot.statistics("lineno")[:10]}
+    with _lock:
+        for site in _published_sites - top.keys():
+            if _MULTIPROCESS:
+                # Removing (or clear()) doesn't reach values already in the
+                # multiprocess files; zero them so they stop reporting bytes
+                TOP_ALLOCATIONS.labels(site=site).set(0)
+            else:
+                TOP_ALLOCATIONS.remove(site)
+        _published_sites.clear()
+        _published_sites.update(top)
+    for site, size in top.items():
+        TOP_ALLOCATIONS.labels(site=site).set(size)
+
+
+class SessionProfiler:
+    """Tracks one session: baseline snapshot at start, diff reports afterwards."""
+
+    def __init__(self, room_name: str):
+        self.room_name = room_name
+        self._baseline: tracemalloc.Snapshot | None = None
+
+    def start(self):
+        LIVE_SESSIONS.inc()
+        update_process_metrics()
+        with _lock:
+            _profilers.add(self)
+        if ENABLED and tracemalloc.is_tracing():
+            self._baseline = _snapshot()
+
+    def end(self):
+        with _lock:
+            _profilers.discard(self)
+        LIVE_SESSIONS.dec()
+        self.report("end")
+        update_process_metrics()
+
+    def report(self, label: str) -> str | None:
+        if self._baseline is None:
+            return None
+        snapshot = _snapshot()
+        _publish_top(snapshot)
+        stats = snapshot.compare_to(self._baseline, "lineno")
+        rss = _process.memory_info().rss
+
+        lines = [
+            f"room={self.room_name} pid={os.getpid()} label={label} time={time.strftime('%Y-%m-%dT%H:%M:%S')}",
+            f"rss={rss / 2**20:.1f}MiB traced={sum(s.size for s in snapshot.statistics('filename')) / 2**20:.1f}MiB "
+            f"growth={sum(s.size_diff for s in stats) / 2**10:+.1f}KiB live_sessions={len(_profilers)}",
+        ]
+        for stat in stats[:TOP_N]:
+            if stat.size_diff == 0:
+                break
+            lines.append(f"{stat.size_diff / 2**10:+10.1f}KiB {stat.count_diff:+7d} blocks  {_site(stat)}")
+
+        safe_room = re.sub(r"[^A-Za-z0-9_.-]", "_", self.room_name)
+        path = os.path.join(REPORT_DIR, f"{safe_room}-{os.getpid()}-{int(time.time())}-{label}.txt")
+        try:
+            os.makedirs(REPORT_DIR, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError:
+            logger.exception("Failed to write memory report for room %s", self.room_name)
+            return None
+        logger.info("🧠 Memory report for room %s written to %s", self.room_name, path)
+        return path
+
+
+def _report_all():
+    update_process_metrics()
+    with _lock:
+        profilers = list(_profilers)
+    for profiler in profilers:
+        profiler.report("signal")
+
+
+def _on_snapshot_signal():
+    # Runs as a loop callback; snapshots and file writes stay off the loop
+    task = asyncio.ensure_future(asyncio.to_thread(_report_all))
+    _signal_tasks.add(task)
+    task.add_done_callback(_signal_tasks.discard)
+
+
+def install_signal_handler():
+    """
+    Report on SIGUSR2 via the running event loop.
+
+    Only the main thread's loop can receive signals, so this is a no-op
+    elsewhere (e.g. in thread-executor jobs, where the worker's loop has
+    it) and when called again for the same loop.
+    """
+    global _signal_loop
+    if not ENABLED or threading.current_thread() is not threading.main_thread():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if loop is _signal_loop:
+        return
+    try:
+        loop.add_signal_handler(signal.SIGUSR2, _on_snapshot_signal)
+    except (NotImplementedError, RuntimeError, ValueError, AttributeError):
+        logger.debug("SIGUSR2 handler not installed")
+        return
+    _signal_loop = loop
@@ -0,0 +1,155 @@
+# room_reaper.py - Reclaims rooms created by /start_call that nobody joined
+"""
+Every room the token service creates is tracked with its dispatch. Once a
+room is older than the TTL and still has no non-agent participant, its
+dispatch and the room itself are deleted, which disconnects the waiting
+agent and frees its worker process.
+
+LiveKit API calls are batched (one ``list_rooms`` per batch of names) and
+bounded by a semaphore; rooms that are already gone or have been joined are
+simply forgotten.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+from livekit.api import LiveKitAPI
+from livekit.protocol import models as proto_models
+from livekit.protocol import room as proto_room
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger("alli-voice-agent")
+
+REAPED_ROOMS = Counter("alli_reaped_rooms_total", "Unjoined rooms deleted by the reaper")
+RECLAIMED_SLOTS = Counter(
+    "alli_reclaimed_worker_slots_total", "Reaped rooms that still held a dispatched agent"
+)
+TRACKED_ROOMS = Gauge("alli_reaper_tracked_rooms", "Rooms awaiting their first participant")
+
+
+@dataclass
+class _TrackedRoom:
+    created_at: float
+    dispatch_id: str | None
+
+
+class RoomReaper:
+    def __init__(
+        self,
+        *,
+        ttl: float = float(os.getenv("ROOM_REAPER_TTL_SECONDS", "120")),
+        interval: float = float(os.getenv("ROOM_REAPER_INTERVAL_SECONDS", "15")),
+        batch_size: int = int(os.getenv("ROOM_REAPER_BATCH_SIZE", "50")),
+        concurrency: int = int(os.getenv("ROOM_REAPER_CONCURRENCY", "8")),
+        on_reap=None,
+    ):
+        self.ttl = ttl
+        self.on_reap = on_reap
+        self.interval = interval
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._rooms: dict[str, _TrackedRoom] = {}
+        self._lk: LiveKitAPI | None = None
+        self._task: asyncio.Task | None = None
+
+    def track(self, room: str, dispatch_id: str | None = None):
+        if self._task is None:
+            # Not running (no LiveKit credentials); nothing would ever reap it
+            return
+        self._rooms[room] = _TrackedRoom(time.monotonic(), dispatch_id)
+        TRACKED_ROOMS.set(len(self._rooms))
+
+    def forget(self, room: str):
+        if self._rooms.pop(room, None) is not None:
+            TRACKED_ROOMS.set(len(self._rooms))
+
+    async def start(self, url: str | None, api_key: str | None, api_secret: str | None):
+        if not (url and api_key and api_secret):
+            # Let the service start (and /health answer) without LiveKit configured
+            logger.warning("LiveKit URL or credentials not set; room reaper disabled")
+            return
+        self._lk = LiveKitAPI(url=url, api_key=api_key, api_secret=api_secret)
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lk is not None:
+            await self._lk.aclose()
+            self._lk = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                reaped = await self.sweep()
+                if reaped:
+                    logger.info("🧹 Reaped %d unjoined room(s)", reaped)
+            except Exception:
+                logger.exception("Room reaper sweep failed")
+
+    async def sweep(self) -> int:
+        cutoff = time.monotonic() - self.ttl
+        expired = [name for name, r in self._rooms.items() if r.created_at <= cutoff]
+        reaped = 0
+        for i in range(0, len(expired), self.batch_size):
+            batch = expired[i:i + self.batch_size]
+            async with self._semaphore:
+                resp = await self._lk.room.list_rooms(proto_room.ListRoomsRequest(names=batch))
+            live = {room.name: room for room in resp.rooms}
+
+            candidates = []
+            for name in batch:
+                room = live.get(name)
+                if room is None or room.num_participants > 1:
+                    # Already closed, or someone besides the agent is in it
+                    self.forget(name)
+                else:
+                    candidates.append(room)
+            results = await asyncio.gather(
+                *(self._reap_if_unjoined(room) for room in candidates), return_exceptions=True
+            )
+            for room, result in zip(candidates, results):
+                if isinstance(result, Exception):
+                    logger.warning("Failed to reap room %s: %s", room.name, result)
+                elif result:
+                    reaped += 1
+        return reaped
+
+    async def _reap_if_unjoined(self, room) -> bool:
+        tracked = self._rooms.get(room.name)
+        if tracked is None:
+            return False
+
+        agent_present = False
+        if room.num_participants == 1:
+            async with self._semaphore:
+                resp = await self._lk.room.list_participants(
+                    proto_room.ListParticipantsRequest(room=room.name)
+                )
+            if any(p.kind != proto_models.ParticipantInfo.Kind.AGENT for p in resp.participants):
+                self.forget(room.name)
+                return False
+            agent_present = bool(resp.participants)
+
+        async with self._semaphore:
+            if tracked.dispatch_id:
+                await self._lk.agent_dispatch.delete_dispatch(tracked.dispatch_id, room.name)
+            await self._lk.room.delete_room(proto_room.DeleteRoomRequest(room=room.name))
+
+        self.forget(room.name)
+        REAPED_ROOMS.inc()
+        if agent_present:
+            RECLAIMED_SLOTS.inc()
+        if self.on_reap is not None:
+            self.on_reap(room.name)
+        return True
@@ -0,0 +1,150 @@
+# session_bench.py - Calls-per-GB and loop latency: one session per process vs multi-session
+"""
+Runs ``--sessions`` simulated sessions, ``--per-process`` of them in each
+worker process, the way ``alli_agent.py`` hosts jobs:
+
+- ``--per-process 1`` is the default mode (one process per job);
+- a larger value is ``ALLI_MULTI_SESSION=1`` (jobs as threads, each with
+  its own event loop, sharing one Silero VAD model).
+
+Each session streams real-time 16 kHz audio (speech-like noise bursts and
+silence) through a Silero VAD stream, which is the per-session work that
+stays local; STT, LLM and TTS run remotely. A 10 ms ticker on every
+session's loop records how late it wakes up, the delay audio frames see.
+
+After ``--seconds`` every process reports its PSS, and the totals are
+printed as calls per GiB and p50/p95/p99 loop lag:
+
+    python session_bench.py --sessions 8 --per-process 1
+    python session_bench.py --sessions 8 --per-process 4
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import random
+import statistics
+import struct
+import threading
+import time
+
+import psutil
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = SAMPLE_RATE // 100  # 10 ms
+
+
+def _audio(seconds: float, seed: int) -> bytes:
+    """Alternating ~1 s noise bursts and silences, int16 mono."""
+    rng = random.Random(seed)
+    samples = []
+    speaking = True
+    while len(samples) < seconds * SAMPLE_RATE:
+        n = int(rng.uniform(0.5, 1.5) * SAMPLE_RATE)
+        amplitude = 6000 if speaking else 30
+        samples.extend(rng.randint(-amplitude, amplitude) for _ in range(n))
+        speaking = not speaking
+    return struct.pack(f"<{len(samples)}h", *samples)
+
+
+async def _session(vad, audio: bytes, seconds: float, lags: list[float]):
+    from livekit import rtc
+
+    stream = vad.stream()
+
+    async def _consume():
+        async for _ in stream:
+            pass
+
+    async def _ticker():
+        expected = time.perf_counter()
+        while True:
+            expected += 0.01
+            await asyncio.sleep(max(0.0, expected - time.perf_counter()))
+            lags.append(time.perf_counter() - expected)
+
+    consumer = asyncio.create_task(_consume())
+    ticker = asyncio.create_task(_ticker())
+    frame_bytes = FRAME_SAMPLES * 2
+    started = time.perf_counter()
+    for i in range(int(seconds * 100)):
+        offset = (i * frame_bytes) % (len(audio) - frame_bytes)
+        stream.push_frame(rtc.AudioFrame(
+            data=audio[offset:offset + frame_bytes],
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            samples_per_channel=FRAME_SAMPLES,
+        ))
+        # Real-time pacing, like a participant's audio track
+        await asyncio.sleep(max(0.0, started + (i + 1) * 0.01 - time.perf_counter()))
+    stream.end_input()
+    ticker.cancel()
+    await consumer
+    await stream.aclose()
+
+
+def _process(index: int, sessions: int, seconds: float, results):
+    try:
+        from livekit.plugins import silero
+
+        vad = silero.VAD.load()  # shared by every session in this process
+        audio = _audio(10.0, index)
+        lags: list[float] = []
+        threads = [
+            threading.Thread(target=asyncio.run, args=(_session(vad, audio, seconds, lags),))
+            for _ in range(sessions)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        info = psutil.Process().memory_full_info()
+        results.put((getattr(info, "pss", info.rss), lags))
+    except BaseException as e:
+        results.put(e)
+        raise
+
+
+def main(args):
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    counts = []
+    remaining = args.sessions
+    while remaining > 0:
+        counts.append(min(args.per_process, remaining))
+        remaining -= counts[-1]
+
+    procs = [ctx.Process(target=_process, args=(i, n, args.seconds, results)) for i, n in enumerate(counts)]
+    for proc in procs:
+        proc.start()
+    memory, lags = 0, []
+    for _ in procs:
+        result = results.get()
+        if isinstance(result, BaseException):
+            for proc in procs:
+                proc.terminate()
+            raise SystemExit(f"Session process failed: {result!r}")
+        pss, proc_lags = result
+        memory += pss
+        lags.extend(proc_lags)
+    for proc in procs:
+        proc.join()
+
+    lags.sort()
+
+    def pct(p):
+        return lags[min(len(lags) - 1, int(len(lags) * p))] * 1000
+
+    print(f"sessions:        {args.sessions} in {len(procs)} process(es), {args.per_process} per process")
+    print(f"memory (PSS):    {memory / 2**20:.0f} MiB total, {memory / 2**20 / args.sessions:.0f} MiB/session")
+    print(f"calls per GiB:   {args.sessions / (memory / 2**30):.1f}")
+    print(f"loop lag ms:     p50={statistics.median(lags) * 1000:.2f} p95={pct(0.95):.2f} p99={pct(0.99):.2f} max={lags[-1] * 1000:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare session density of per-process and multi-session workers")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--per-process", type=int, default=1, help="1 = one process per job; >1 = multi-session")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    main(parser.parse_args())
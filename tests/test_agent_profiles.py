@@ -0,0 +1,25 @@
+import json
+
+from agent_profiles import ProfileRegistry
+
+
+def _registry(tmp_path, profiles):
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps(profiles), encoding="utf-8")
+    return ProfileRegistry(str(path))
+
+
+def test_non_object_entries_are_skipped(tmp_path):
+    registry = _registry(tmp_path, {"a": "oops", "b": {"prewarm": True, "greeting": "Hi"}})
+    assert [p.agent_id for p in registry.hot_profiles()] == ["b"]
+    assert registry.get("a").agent_id == "a"  # falls back to the default profile
+
+
+def test_file_profiles_use_env_defaults(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4.1-mini")
+    monkeypatch.setenv("OPENAI_TEMPERATURE", "0.2")
+    registry = _registry(tmp_path, {"a": {"greeting": "Hi"}, "b": {"llm_temperature": "0.9"}})
+    a, b, unknown = registry.get("a"), registry.get("b"), registry.get("missing")
+    assert (a.llm_model, a.llm_temperature, a.greeting) == ("gpt-4.1-mini", 0.2, "Hi")
+    assert (b.llm_model, b.llm_temperature) == ("gpt-4.1-mini", 0.9)
+    assert (unknown.llm_model, unknown.llm_temperature) == ("gpt-4.1-mini", 0.2)
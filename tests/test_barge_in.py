@@ -0,0 +1,64 @@
+# Scripted overlapping-speech sequences for BargeInMonitor
+from barge_in import BargeInMonitor
+
+
+def _run(script):
+    monitor = BargeInMonitor("room-test")
+    for who, state, ts in script:
+        if who == "agent":
+            monitor.on_agent_state(state, ts)
+        else:
+            monitor.on_user_state(state, ts)
+    return monitor
+
+
+def test_agent_stops_after_user_onset():
+    monitor = _run([
+        ("agent", "speaking", 10.0),
+        ("user", "speaking", 11.0),
+        ("agent", "listening", 11.25),
+        ("user", "listening", 12.0),
+    ])
+    assert monitor.latencies == [0.25]
+    assert monitor.ignored == 0
+    summary = monitor.summary()
+    assert summary["interruptions"] == 1
+    assert summary["p50_ms"] == 250.0
+
+
+def test_user_finishes_before_agent_stops():
+    monitor = _run([
+        ("agent", "speaking", 10.0),
+        ("user", "speaking", 11.0),
+        ("user", "listening", 11.2),
+        ("agent", "listening", 13.0),
+    ])
+    assert monitor.latencies == []
+    assert monitor.ignored == 1
+
+
+def test_onset_while_agent_silent():
+    monitor = _run([
+        ("agent", "listening", 10.0),
+        ("user", "speaking", 11.0),
+        ("agent", "thinking", 12.0),
+        ("agent", "speaking", 12.5),
+        ("agent", "listening", 14.0),
+    ])
+    assert monitor.latencies == []
+    assert monitor.ignored == 0
+    assert monitor.summary() == {"interruptions": 0, "ignored": 0}
+
+
+def test_several_interruptions():
+    monitor = _run([
+        ("agent", "speaking", 0.0),
+        ("user", "speaking", 1.0),
+        ("agent", "listening", 1.1),
+        ("user", "listening", 2.0),
+        ("agent", "speaking", 3.0),
+        ("user", "speaking", 4.0),
+        ("agent", "listening", 4.4),
+    ])
+    assert [round(x, 3) for x in monitor.latencies] == [0.1, 0.4]
+    assert monitor.summary()["max_ms"] == 400.0
@@ -0,0 +1,24 @@
+import asyncio
+import sqlite3
+
+from call_store import CallRecordStore
+
+
+def test_close_writes_in_flight_and_queued_records(tmp_path):
+    path = str(tmp_path / "calls.db")
+
+    async def run():
+        store = CallRecordStore(path)
+        await store.start()
+        for i in range(20_000):
+            store.record("start_call", room=f"room-{i}")
+        # Let the flush loop get a batch into its write thread
+        await asyncio.sleep(0.05)
+        await store.close()
+        return store
+
+    store = asyncio.run(run())
+    count = sqlite3.connect(path).execute("SELECT COUNT(*) FROM call_records").fetchone()[0]
+    assert count == 20_000
+    assert store.written == 20_000
+    assert store.dropped == 0
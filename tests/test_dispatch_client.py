@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("livekit.api")
+
+from livekit.api.twirp_client import TwirpError
+
+from dispatch_client import CircuitBreaker, CircuitOpenError, ResilientDispatcher, _StubRequest
+
+
+class _FailingService:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    async def create_dispatch(self, request):
+        self.calls += 1
+        raise self.error
+
+
+def _dispatcher():
+    return ResilientDispatcher(max_attempts=2, backoff_base=0, breaker=CircuitBreaker(failure_threshold=3))
+
+
+def test_client_errors_do_not_open_the_breaker():
+    dispatcher = _dispatcher()
+    service = _FailingService(TwirpError("invalid_argument", "bad agent name", status=400))
+
+    async def run():
+        for _ in range(10):
+            with pytest.raises(TwirpError):
+                await dispatcher.create_dispatch(service, _StubRequest("room"))
+
+    asyncio.run(run())
+    assert service.calls == 10  # not retried
+    assert dispatcher.breaker.state == "closed"
+
+
+def test_server_errors_open_the_breaker():
+    dispatcher = _dispatcher()
+    service = _FailingService(TwirpError("unavailable", "down", status=503))
+
+    async def run():
+        with pytest.raises(TwirpError):
+            await dispatcher.create_dispatch(service, _StubRequest("room"))
+        # The third consecutive failure opens the breaker before the retry
+        with pytest.raises(CircuitOpenError):
+            await dispatcher.create_dispatch(service, _StubRequest("room"))
+
+    asyncio.run(run())
+    assert service.calls == 3
+    assert dispatcher.breaker.state == "open"
+
+
+def test_cancelled_trial_releases_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()  # open; immediately half-open
+    dispatcher = ResilientDispatcher(breaker=breaker)
+
+    class _HangingService:
+        async def create_dispatch(self, request):
+            await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.create_task(dispatcher.create_dispatch(_HangingService(), _StubRequest("room")))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.allow()  # a new trial is let through
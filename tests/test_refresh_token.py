@@ -0,0 +1,92 @@
+import asyncio
+import json
+import time
+
+import jwt
+import pytest
+
+main = pytest.importorskip("main")
+
+ROOM = "room-a-1234"
+PARTICIPANT = "participant-a-1234"
+
+
+@pytest.fixture(autouse=True)
+def _credentials(monkeypatch):
+    monkeypatch.setattr(main, "LIVEKIT_API_KEY", "test-key")
+    monkeypatch.setattr(main, "LIVEKIT_API_SECRET", "test-secret-of-sufficient-length")
+    monkeypatch.setattr(main, "_ended_rooms", main.OrderedDict())
+
+
+def _token(room=ROOM, participant=PARTICIPANT, started=None, ttl=600):
+    started = time.time() if started is None else started
+    return main.build_participant_token(room, participant, {"agent_id": "a"}, started, ttl=ttl)
+
+
+def _refresh(token, room=ROOM, participant=PARTICIPANT):
+    request = main.RefreshTokenRequest(roomName=room, participantId=participant, token=token)
+    return asyncio.run(main.refresh_token(request))
+
+
+def _status(response):
+    return getattr(response, "status_code", 200)
+
+
+def _claims(token):
+    return jwt.decode(token, main.LIVEKIT_API_SECRET, algorithms=["HS256"], issuer=main.LIVEKIT_API_KEY)
+
+
+def test_valid_token_is_refreshed():
+    response = _refresh(_token())
+    assert _status(response) == 200
+    claims = _claims(response["data"]["token"])
+    assert claims["sub"] == PARTICIPANT and claims["video"]["room"] == ROOM
+    assert json.loads(claims["metadata"])["agent_id"] == "a"
+
+
+def test_forged_signature_is_rejected():
+    claims = _claims(_token())
+    forged = jwt.encode(claims, "another-secret-of-sufficient-length", algorithm="HS256")
+    assert _status(_refresh(forged)) == 401
+
+
+def test_wrong_issuer_is_rejected():
+    claims = {**_claims(_token()), "iss": "other-key"}
+    token = jwt.encode(claims, main.LIVEKIT_API_SECRET, algorithm="HS256")
+    assert _status(_refresh(token)) == 401
+
+
+@pytest.mark.parametrize("room,participant", [("room-b-5678", PARTICIPANT), (ROOM, "participant-b-5678")])
+def test_room_or_participant_mismatch_is_forbidden(room, participant):
+    assert _status(_refresh(_token(), room=room, participant=participant)) == 403
+
+
+def test_token_past_grace_period_is_rejected():
+    started = time.time() - main.TOKEN_REFRESH_GRACE_SECONDS - 120
+    token = _token(started=started, ttl=-main.TOKEN_REFRESH_GRACE_SECONDS - 60)
+    assert _status(_refresh(token)) == 401
+
+
+def test_recently_expired_token_is_refreshed():
+    assert _status(_refresh(_token(ttl=-60))) == 200
+
+
+def test_ended_room_is_gone():
+    token = _token()
+    main._on_call_event({"room": ROOM, "event": "room_reaped", "ts": time.time()})
+    assert _status(_refresh(token)) == 410
+
+
+def test_ttl_is_clamped_to_max_call_length():
+    started = time.time() - main.MAX_CALL_SECONDS + 100
+    response = _refresh(_token(started=started))
+    assert _status(response) == 200
+    assert 0 < response["data"]["expiresIn"] <= 100
+    claims = _claims(response["data"]["token"])
+    assert claims["exp"] <= started + main.MAX_CALL_SECONDS + 1
+    assert json.loads(claims["metadata"])["call_started_at"] == pytest.approx(started)
+
+
+def test_call_past_max_length_is_rejected():
+    started = time.time() - main.MAX_CALL_SECONDS - 1
+    assert _status(_refresh(_token(started=started))) == 401
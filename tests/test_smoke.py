@@ -0,0 +1,54 @@
+# Import smoke checks for the service and worker modules
+import ast
+import builtins
+import importlib
+import pathlib
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+MODULES = sorted(p.stem for p in ROOT.glob("*.py"))
+
+
+def _bound_names(tree: ast.AST) -> set[str]:
+    """Every name the module binds anywhere (assignments, imports, defs, args, ...)."""
+    names = set(dir(builtins)) | {"__file__", "__name__", "__doc__"}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.alias):
+            names.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+    return names
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_no_undefined_names(module):
+    # Runs without the third-party dependencies installed
+    tree = ast.parse((ROOT / f"{module}.py").read_text(encoding="utf-8"))
+    bound = _bound_names(tree)
+    undefined = sorted({
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in bound
+    })
+    assert not undefined, f"{module}.py uses undefined names: {undefined}"
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import(module):
+    try:
+        importlib.import_module(module)
+    except ModuleNotFoundError as e:
+        if e.name and e.name.split(".")[0] in MODULES:
+            raise
+        pytest.skip(f"{e.name} is not installed")
+    except ImportError as e:
+        # Plugins are namespace packages: a missing one is a failed name import
+        if e.name != "livekit.plugins":
+            raise
+        pytest.skip(str(e))
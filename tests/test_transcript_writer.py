@@ -0,0 +1,43 @@
+import gzip
+import json
+import os
+
+from transcript_writer import TranscriptWriter
+
+
+def _read(directory):
+    records = []
+    for name in sorted(os.listdir(directory)):
+        # Raises EOFError for a file without its gzip trailer
+        with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f)
+    return records
+
+
+def test_last_call_end_finishes_the_file_without_close(tmp_path):
+    writer = TranscriptWriter(str(tmp_path))
+    writer.write("room-a", "call_start")
+    writer.write("room-b", "call_start")
+    writer.write("room-a", "message", role="user", text="hi")
+    writer.write("room-a", "call_end")
+    assert writer.flush(finish_if_idle=True)
+    assert writer._gz is not None  # room-b is still open
+
+    writer.write("room-b", "call_end")
+    assert writer.flush(finish_if_idle=True)
+    # Process exits without close() / atexit, as job processes do
+    records = _read(tmp_path)
+    assert [r["type"] for r in records] == ["call_start", "call_start", "message", "call_end", "call_end"]
+    assert records[3]["raw_bytes"] > 0
+
+
+def test_writes_after_finish_go_to_a_new_file(tmp_path):
+    writer = TranscriptWriter(str(tmp_path))
+    writer.write("room-a", "call_start")
+    writer.write("room-a", "call_end")
+    writer.flush(finish_if_idle=True)
+    writer.write("room-b", "call_start")
+    writer.write("room-b", "call_end")
+    writer.flush(finish_if_idle=True)
+    assert len(os.listdir(tmp_path)) == 2
+    assert len(_read(tmp_path)) == 4
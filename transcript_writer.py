@@ -0,0 +1,256 @@
+# transcript_writer.py - Streaming, compressed transcript and per-turn metrics export
+"""
+Sessions append records (call start/end, chat messages, per-turn
+latencies) as they happen; a background thread encodes them into gzip
+JSONL files under ``TRANSCRIPT_DIR``. Files rotate by compressed size and
+age, and are sync-flushed every ``flush_interval`` so a partial file is
+readable with ``zcat``. At shutdown a session only waits for a final
+flush, which also finishes the gzip file once no call in the process is
+still open: job processes usually exit without running ``atexit``
+handlers, and a file without its gzip trailer fails to decompress.
+
+Each ``call_end`` record carries the call's raw bytes and its estimated
+compressed share of disk. Compare against a pretty-printed JSON dump per
+call with:
+
+    python transcript_writer.py bench --calls 200 --turns 20
+"""
+from __future__ import annotations
+
+import argparse
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import zlib
+
+logger = logging.getLogger("alli-voice-agent")
+
+ENABLED = os.getenv("ALLI_TRANSCRIPTS", "0") == "1"
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "transcripts")
+
+
+class TranscriptWriter:
+    def __init__(
+        self,
+        directory: str = TRANSCRIPT_DIR,
+        *,
+        max_bytes: int = int(os.getenv("TRANSCRIPT_MAX_BYTES", str(64 * 2**20))),
+        max_age: float = float(os.getenv("TRANSCRIPT_MAX_AGE_SECONDS", "3600")),
+        flush_interval: float = 1.0,
+        compresslevel: int = 6,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.compresslevel = compresslevel
+        self._queue: queue.Queue = queue.Queue()
+        self._raw = None
+        self._gz: gzip.GzipFile | None = None
+        self._opened_at = 0.0
+        self._file_raw_bytes = 0
+        self._file_seq = 0
+        self._room_raw_bytes: dict[str, int] = {}
+        self._open_calls: set[str] = set()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    # -- called from sessions (any thread, never blocks) --
+
+    def write(self, room: str, kind: str, **fields):
+        if not self._closed:
+            self._queue.put_nowait({"ts": time.time(), "room": room, "type": kind, **fields})
+
+    def flush(self, timeout: float = 5.0, *, finish_if_idle: bool = False) -> bool:
+        """
+        Wait until everything queued so far is on disk.
+
+        With ``finish_if_idle``, the current file is also completed (gzip
+        trailer written) when every call started in it has ended.
+        """
+        done = threading.Event()
+        self._queue.put((done, finish_if_idle))
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # -- writer thread --
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        self._file_seq += 1
+        path = os.path.join(self.directory, f"transcripts_{stamp}_{os.getpid()}_{self._file_seq:04d}.jsonl.gz")
+        self._raw = open(path, "ab")
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="ab", compresslevel=self.compresslevel)
+        self._opened_at = time.monotonic()
+        self._file_raw_bytes = 0
+
+    def _close_file(self):
+        if self._gz is not None:
+            self._gz.close()
+            self._raw.close()
+            self._gz = self._raw = None
+
+    def _sync(self):
+        if self._gz is not None:
+            self._gz.flush(zlib.Z_SYNC_FLUSH)
+            self._raw.flush()
+
+    def _write_record(self, record: dict):
+        room = record["room"]
+        if record["type"] == "call_start":
+            self._open_calls.add(room)
+        elif record["type"] == "call_end":
+            self._open_calls.discard(room)
+        if record["type"] == "call_end":
+            # Disk cost of the call: its raw bytes, and their share of the
+            # compressed file at the file's current compression ratio
+            raw = self._room_raw_bytes.pop(room, 0)
+            ratio = self._raw.tell() / self._file_raw_bytes if self._gz is not None and self._file_raw_bytes else 1.0
+            record["raw_bytes"] = raw
+            record["est_compressed_bytes"] = round(raw * ratio)
+
+        line = (json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        if self._gz is None:
+            self._open()
+        self._gz.write(line)
+        self._file_raw_bytes += len(line)
+        if record["type"] != "call_end":
+            self._room_raw_bytes[room] = self._room_raw_bytes.get(room, 0) + len(line)
+
+    def _run(self):
+        dirty = False
+        last_sync = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ...
+
+            try:
+                if item is None:
+                    self._close_file()
+                    return
+                if isinstance(item, tuple):
+                    done, finish_if_idle = item
+                    if finish_if_idle and not self._open_calls:
+                        self._close_file()
+                    else:
+                        self._sync()
+                    dirty = False
+                    last_sync = time.monotonic()
+                    done.set()
+                elif item is not ...:
+                    self._write_record(item)
+                    dirty = True
+
+                if dirty and time.monotonic() - last_sync >= self.flush_interval:
+                    self._sync()
+                    dirty = False
+                    last_sync = time.monotonic()
+
+                if self._gz is not None and (
+                    self._raw.tell() >= self.max_bytes or time.monotonic() - self._opened_at >= self.max_age
+                ):
+                    self._close_file()
+            except Exception:
+                logger.exception("Transcript writer failed")
+                if isinstance(item, tuple):
+                    item[0].set()
+
+
+_writer: TranscriptWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> TranscriptWriter | None:
+    """Process-wide writer, or None when transcripts are disabled."""
+    global _writer
+    if not ENABLED:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = TranscriptWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def _bench(args):
+    import random
+
+    rng = random.Random(7)
+    words = ("order status week arrived account billing refund delivery address change update help "
+             "please thanks sure question issue payment card number today tomorrow morning call back").split()
+
+    def utterance():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(6, 24))).capitalize() + "."
+
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = TranscriptWriter(os.path.join(tmp, "stream"))
+        dump_bytes = 0
+        write_ns = []
+        for call in range(args.calls):
+            room = f"room-agent-{call:06d}"
+            history = []
+            t0 = time.perf_counter_ns()
+            writer.write(room, "call_start", agent_id="agent-1")
+            write_ns.append(time.perf_counter_ns() - t0)
+            for turn in range(args.turns):
+                for role in ("user", "assistant"):
+                    msg = {"role": role, "content": [utterance()], "interrupted": False}
+                    history.append({"type": "message", "id": f"item_{turn}_{role}", **msg})
+                    t0 = time.perf_counter_ns()
+                    writer.write(room, "message", **msg)
+                    write_ns.append(time.perf_counter_ns() - t0)
+                writer.write(room, "turn_metrics", speech_id=f"speech_{turn}", eou_delay=round(rng.uniform(0.2, 0.8), 3),
+                             llm_ttft=round(rng.uniform(0.2, 0.6), 3), tts_ttfb=round(rng.uniform(0.1, 0.3), 3))
+            writer.write(room, "call_end", duration=120.0, turns=args.turns)
+
+            # Baseline: pretty-printed dump of the whole history at shutdown
+            path = os.path.join(tmp, f"dump_{call}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"room": room, "history": {"items": history}}, f, indent=2, ensure_ascii=False)
+            dump_bytes += os.path.getsize(path)
+            os.remove(path)
+
+        t0 = time.perf_counter()
+        writer.flush()
+        final_flush = time.perf_counter() - t0
+        writer.close()
+        stream_bytes = sum(
+            os.path.getsize(os.path.join(tmp, "stream", name)) for name in os.listdir(os.path.join(tmp, "stream"))
+        )
+
+    write_ns.sort()
+    print(f"calls x turns:          {args.calls} x {args.turns}")
+    print(f"write() p50/p99:        {write_ns[len(write_ns) // 2] / 1e3:.1f} / {write_ns[int(len(write_ns) * 0.99)] / 1e3:.1f} us")
+    print(f"final flush:            {final_flush * 1000:.1f} ms")
+    print(f"json.dump(indent=2):    {dump_bytes / args.calls:,.0f} bytes/call")
+    print(f"streamed gzip JSONL:    {stream_bytes / args.calls:,.0f} bytes/call (incl. turn metrics)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcript export tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="Measure disk cost per call")
+    bench.add_argument("--calls", type=int, default=200)
+    bench.add_argument("--turns", type=int, default=20)
+    bench.set_defaults(func=_bench)
+    args = parser.parse_args()
+    args.func(args)
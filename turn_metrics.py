@@ -0,0 +1,53 @@
+# turn_metrics.py - Per-turn latency from the session's metrics events
+from __future__ import annotations
+
+from collections import OrderedDict, deque
+
+from livekit.agents.metrics import EOUMetrics, LLMMetrics, TTSMetrics
+
+# Recent turn latencies (seconds) of every session in this process
+recent_turn_latencies: deque[float] = deque(maxlen=100)
+
+
+class TurnLatencyTracker:
+    """
+    Combines the metrics emitted for one reply (same ``speech_id``) into a
+    per-turn latency: end-of-utterance delay + LLM time to first token +
+    TTS time to first byte, i.e. user stops speaking -> first agent audio.
+    """
+
+    def __init__(self, on_turn=None, max_pending: int = 32):
+        self.on_turn = on_turn
+        self.max_pending = max_pending
+        self.turns = 0
+        self._pending: OrderedDict[str, dict] = OrderedDict()
+
+    def attach(self, session):
+        session.on("metrics_collected", lambda ev: self.on_metrics(ev.metrics))
+
+    def on_metrics(self, m):
+        speech_id = getattr(m, "speech_id", None)
+        if not speech_id:
+            return
+        if isinstance(m, EOUMetrics):
+            key, value = "eou_delay", m.end_of_utterance_delay
+        elif isinstance(m, LLMMetrics):
+            key, value = "llm_ttft", m.ttft
+        elif isinstance(m, TTSMetrics):
+            key, value = "tts_ttfb", m.ttfb
+        else:
+            return
+
+        parts = self._pending.setdefault(speech_id, {})
+        parts[key] = value
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+        if len(parts) < 3:
+            return
+
+        del self._pending[speech_id]
+        total = sum(parts.values())
+        self.turns += 1
+        recent_turn_latencies.append(total)
+        if self.on_turn is not None:
+            self.on_turn(speech_id, parts, total)
@@ -0,0 +1,287 @@
+# worker_status.py - Status reports shared between agent workers and the token service
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import time
+
+logger = logging.getLogger("alli-voice-agent")
+
+# Workers and the token service run on the same host (or share this
+# directory); each worker process owns one small JSON file in it.
+STATUS_DIR = os.getenv("ALLI_WORKER_STATUS_DIR", "worker_status")
+STALE_AFTER_SECONDS = float(os.getenv("ALLI_WORKER_STATUS_STALE_SECONDS", "15"))
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def write_report(name: str, report: dict):
+    """Atomically replace the report file ``<STATUS_DIR>/<name>.json``."""
+    report = {**report, "updated_at": time.time()}
+    os.makedirs(STATUS_DIR, exist_ok=True)
+    path = os.path.join(STATUS_DIR, f"{name}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def remove_report(name: str):
+    try:
+        os.remove(os.path.join(STATUS_DIR, f"{name}.json"))
+    except FileNotFoundError:
+        pass
+
+
+def read_reports() -> list[dict]:
+    """Return all reports that were refreshed within ``STALE_AFTER_SECONDS``."""
+    try:
+        names = os.listdir(STATUS_DIR)
+    except FileNotFoundError:
+        return []
+
+    now = time.time()
+    reports = []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(STATUS_DIR, name), "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            # Being replaced or removed right now; the next read will see it
+            continue
+        if now - report.get("updated_at", 0) <= STALE_AFTER_SECONDS:
+            reports.append(report)
+    return reports
+
+
+# -------------------------
+# Job-process markers
+# -------------------------
+# Each prewarmed job process (or executor thread) drops a marker in
+# <STATUS_DIR>/procs so its worker can count warm idle capacity and collect
+# recent turn latencies. Markers are owned by the process that wrote them
+# and removed when its session ends.
+PROCS_DIR = os.path.join(STATUS_DIR, "procs")
+
+
+def write_proc_marker(key: str, marker: dict):
+    os.makedirs(PROCS_DIR, exist_ok=True)
+    path = os.path.join(PROCS_DIR, f"{key}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**marker, "pid": os.getpid(), "updated_at": time.time()}, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def remove_proc_marker(key: str):
+    try:
+        os.remove(os.path.join(PROCS_DIR, f"{key}.json"))
+    except FileNotFoundError:
+        pass
+
+
+def read_proc_markers(worker_pid: int) -> list[dict]:
+    """Markers written by live job processes of the worker ``worker_pid``."""
+    try:
+        names = os.listdir(PROCS_DIR)
+    except FileNotFoundError:
+        return []
+
+    markers = []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(PROCS_DIR, name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                marker = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if marker.get("worker_pid") != worker_pid:
+            continue
+        if not _pid_alive(marker.get("pid")):
+            # Process died without cleaning up
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        markers.append(marker)
+    return markers
+
+
+def _pid_alive(pid) -> bool:
+    if not isinstance(pid, int):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+# -------------------------
+# Pool selection
+# -------------------------
+def pool_summary(reports: list[dict]) -> dict:
+    """Aggregate the reports of one worker pool's non-draining workers."""
+    live = [r for r in reports if not r.get("draining")]
+    p95s = [r["turn_p95_ms"] for r in live if r.get("turn_p95_ms") is not None]
+    return {
+        "workers": len(live),
+        "idle_warm": sum(r.get("idle_warm", 0) for r in live),
+        "active_sessions": sum(r.get("active_sessions", 0) for r in live),
+        "prewarmed": any(r.get("prewarmed") for r in live),
+        "load": min((r.get("load", 0.0) for r in live), default=1.0),
+        "turn_p95_ms": max(p95s) if p95s else None,
+    }
+
+
+def choose_pool(names: list[str], reports: list[dict]) -> str | None:
+    """
+    Pick the agent name to dispatch to.
+
+    Pools with warm idle processes come first, then the least loaded, then
+    the one with the best recent turn latency. Pools without reports are
+    used only when no reporting pool has a non-draining worker, and if every
+    pool is draining the first name is returned so the dispatch waits for
+    replacements instead of failing.
+    """
+    if not names:
+        return None
+    if len(names) == 1:
+        return names[0]
+
+    candidates = []
+    unknown = None
+    for index, name in enumerate(names):
+        pool = [r for r in reports if r.get("agent_name") == name]
+        if not pool:
+            unknown = unknown or name
+            continue
+        summary = pool_summary(pool)
+        if not summary["workers"]:
+            continue
+        candidates.append((
+            summary["idle_warm"] == 0,
+            not summary["prewarmed"],
+            round(summary["load"], 1),
+            summary["turn_p95_ms"] if summary["turn_p95_ms"] is not None else float("inf"),
+            index,
+            name,
+        ))
+    if candidates:
+        return min(candidates)[-1]
+    return unknown or names[0]
+
+
+def note_dispatch(reports: list[dict], name: str):
+    """
+    Account for a dispatch in cached reports until fresh ones arrive.
+
+    Without this, every call between two report refreshes would pile onto
+    the same pool's (already used) warm processes.
+    """
+    for report in reports:
+        if report.get("agent_name") == name and not report.get("draining") and report.get("idle_warm", 0) > 0:
+            report["idle_warm"] -= 1
+            report["active_sessions"] = report.get("active_sessions", 0) + 1
+            return
+
+
+# -------------------------
+# Routing simulation
+# -------------------------
+def _simulate(args):
+    """
+    Compare time-to-greeting when every call goes to the first pool versus
+    routing with ``choose_pool`` on (slightly stale) load reports.
+
+    Each pool keeps ``--idle`` prewarmed processes; a call that finds none
+    waits for a cold process start. A used process is replaced after
+    ``--prewarm`` seconds.
+    """
+    import heapq
+    import random
+    import statistics
+
+    names = [f"pool-{i}" for i in range(args.pools)]
+    results = {}
+    for policy in ("static", "load-aware"):
+        rng = random.Random(args.seed)
+        pools = {n: {"idle": args.idle, "active": 0} for n in names}
+        events = []  # (time, kind, pool)
+        reports, reported_at = [], -1.0
+        ttg = []
+        t = 0.0
+        for _ in range(args.calls):
+            t += rng.expovariate(args.rate)
+            while events and events[0][0] <= t:
+                _, kind, name = heapq.heappop(events)
+                if kind == "warm":
+                    pools[name]["idle"] += 1
+                else:
+                    pools[name]["active"] -= 1
+            if t - reported_at >= args.report_interval:
+                reports = [
+                    {"agent_name": n, "idle_warm": p["idle"], "active_sessions": p["active"],
+                     "prewarmed": True, "load": min(1.0, p["active"] / args.capacity)}
+                    for n, p in pools.items()
+                ]
+                reported_at = t
+
+            if policy == "static":
+                name = names[0]
+            else:
+                name = choose_pool(names, reports)
+                note_dispatch(reports, name)
+            pool = pools[name]
+            if pool["idle"] > 0:
+                # Warm process takes the call; the pool starts a replacement
+                pool["idle"] -= 1
+                delay = args.warm_ttg
+                heapq.heappush(events, (t + args.prewarm, "warm", name))
+            else:
+                delay = args.warm_ttg + args.prewarm
+            pool["active"] += 1
+            heapq.heappush(events, (t + delay + rng.expovariate(1 / args.duration), "end", name))
+            ttg.append(delay + rng.uniform(0, 0.1))
+
+        ttg.sort()
+        results[policy] = ttg
+        print(f"{policy:>10}: time-to-greeting mean={statistics.fmean(ttg):.2f}s "
+              f"p50={ttg[len(ttg) // 2]:.2f}s p95={ttg[int(len(ttg) * 0.95)]:.2f}s "
+              f"cold={sum(1 for x in ttg if x > args.warm_ttg + 0.1) / len(ttg):.1%}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate load-aware dispatch routing")
+    parser.add_argument("--pools", type=int, default=3)
+    parser.add_argument("--idle", type=int, default=2, help="prewarmed idle processes per pool")
+    parser.add_argument("--capacity", type=int, default=20, help="sessions per pool")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=1.5, help="calls per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="mean call length (s)")
+    parser.add_argument("--prewarm", type=float, default=3.0, help="process start + prewarm time (s)")
+    parser.add_argument("--warm-ttg", type=float, default=0.8, help="time-to-greeting on a warm process (s)")
+    parser.add_argument("--report-interval", type=float, default=2.5)
+    parser.add_argument("--seed", type=int, default=7)
+    _simulate(parser.parse_args())